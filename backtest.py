@@ -0,0 +1,97 @@
+import logging
+import os
+import time
+
+import numpy as np
+
+DAY = 86400
+
+
+# Local cache of daily candles, one compact .npz file per symbol (int32 day numbers and
+# float32 closes) plus the first day that was requested. Candles are fetched from the providers once
+# and shared by every user and run; a symbol is only refetched when its file is older than max_age or
+# was fetched for a shorter range. Symbols with less history than requested (recent listings) are
+# covered by the requested start, not by their first candle.
+class CandleCache:
+    def __init__(self, directory, max_age=12 * 3600):
+        self.directory = directory
+        self.max_age = max_age
+
+    def path(self, symbol):
+        return os.path.join(self.directory, f"{symbol}.npz")
+
+    def load(self, symbol):
+        try:
+            with np.load(self.path(symbol)) as data:
+                return data["days"], data["closes"], int(data["start_day"]), float(data["fetched_at"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def save(self, symbol, days, closes, start_day):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, f"{symbol}.tmp.npz")
+        np.savez(tmp_path, days=np.asarray(days, dtype=np.int32), closes=np.asarray(closes, dtype=np.float32),
+                 start_day=np.int32(start_day), fetched_at=np.float64(time.time()))
+        os.replace(tmp_path, self.path(symbol))
+
+    # Cached candles covering the last `days` days, or None if they need fetching
+    def get(self, symbol, days):
+        cached = self.load(symbol)
+        if cached is None:
+            return None
+        cached_days, closes, start_day, fetched_at = cached
+        first_day = int(time.time() // DAY) - days
+        # A day of slack so a range fetched yesterday still covers today's request
+        if time.time() - fetched_at > self.max_age or start_day > first_day + 1:
+            return None
+        keep = cached_days >= first_day
+        return cached_days[keep], closes[keep]
+
+    # Return candles for the last `days` days, fetching and caching them if needed.
+    # fetch(symbol, start, end) is the provider call and returns (timestamps, closes) or None.
+    async def fetch(self, symbol, days, fetch):
+        cached = self.get(symbol, days)
+        if cached is not None:
+            return cached
+        end = time.time()
+        # Always fetch at least a year so later runs with other ranges hit the cache
+        start = end - max(days, 365) * DAY
+        candles = await fetch(symbol, start, end)
+        if candles is None:
+            return None
+        timestamps, closes = candles
+        candle_days = np.asarray(timestamps, dtype=np.int64) // DAY
+        self.save(symbol, candle_days, closes, int(start // DAY))
+        logging.info(f"Cached {len(closes)} daily candles for {symbol}")
+        return self.get(symbol, days) or (np.asarray(candle_days, dtype=np.int32), np.asarray(closes, dtype=np.float32))
+
+
+# Replay daily closes the way the monitor checks prices: an alert fires whenever the move since
+# the previous check is at least the threshold, and every check resets the reference price.
+# Runs in a worker process, so it only takes and returns plain arrays.
+#   closes_by_symbol: list of 1-D close arrays, one per symbol
+#   thresholds:       1-D array of thresholds in percent
+# Returns (alerts per threshold, alerts per symbol per threshold as a [symbols x thresholds] array).
+def simulate_alerts(closes_by_symbol, thresholds):
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    moves = []
+    owners = []
+    for i, closes in enumerate(closes_by_symbol):
+        closes = np.asarray(closes, dtype=np.float64)
+        if len(closes) < 2:
+            continue
+        with np.errstate(divide="ignore", invalid="ignore"):
+            move = np.abs(np.diff(closes) / closes[:-1]) * 100
+        move = move[np.isfinite(move)]
+        moves.append(move)
+        owners.append(np.full(len(move), i))
+
+    per_symbol = np.zeros((len(closes_by_symbol), len(thresholds)), dtype=np.int64)
+    if not moves:
+        return np.zeros(len(thresholds), dtype=np.int64), per_symbol
+
+    moves = np.concatenate(moves)
+    owners = np.concatenate(owners)
+    crossed = moves[:, None] >= thresholds[None, :]
+    np.add.at(per_symbol, owners, crossed)
+    return per_symbol.sum(axis=0), per_symbol
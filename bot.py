@@ -1,4 +1,5 @@
 import discord
+from discord import app_commands
 import os
 import random
 import asyncio
@@ -9,11 +10,24 @@ from datetime import datetime
 import logging
 import sys
 import psycopg2
-from psycopg2.extras import DictCursor
+from psycopg2.extras import DictCursor, execute_values
 import signal
 import requests
 import aiohttp
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from logging.handlers import RotatingFileHandler
+from poll_planner import PollPlanner
+from sweep import SweepScheduler
+from providers import FakeProvider, FinnhubProvider, FMPProvider, ProviderRouter, next_month_start
+from backtest import CandleCache, simulate_alerts
+from leaderboard import LiveLeaderboard
+from loop_watchdog import LoopWatchdog, profile_thread
+from quote_cache import QuoteCache
+from symbols import SymbolIndex
+from watch_arrays import WatchArrays
+from watch_index import WATCH_TRIGGERS_SQL, WatchIndex
 
 # UPDATE MESSAGE
 update_message = (
@@ -22,7 +36,7 @@ update_message = (
     "1. **Individual Watchlists**: Track your own stocks separately from others in the server. "
     "Your watchlist is private to you, and you can add or remove stocks as you like.\n\n"
     "2. **Leaderboard**: Compete with other users! See the best-performing watchlists based on daily percentage changes. "
-    "The leaderboard updates every day after market close.\n\n"
+    "The leaderboard updates live throughout the day as prices are checked.\n\n"
     "3. **Automatic Update Summaries**: Whenever the bot restarts, this message will notify you about recent updates and improvements.\n\n"
     "**Commands Refresher**:\n\n"
     "- Use `!addstock SYMBOL` to add a stock to your watchlist.\n\n"
@@ -57,20 +71,37 @@ if not HEROKU_APP_NAME:
     logging.warning("HEROKU_APP_NAME is not set. Stock price fetches may fail.")
 
 # Discord client setup
+# Prefix (!) commands need the privileged message content intent. Set MESSAGE_CONTENT_INTENT=false
+# to run on slash commands only, so the bot no longer receives the content of every message.
+MESSAGE_CONTENT_INTENT = os.getenv("MESSAGE_CONTENT_INTENT", "true").lower() != "false"
 intents = discord.Intents.default()
-intents.message_content = True
+intents.message_content = MESSAGE_CONTENT_INTENT
 client = discord.Client(intents=intents)
+tree = app_commands.CommandTree(client)
 
 # Finnhub API Key
 FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY')
 if not FINNHUB_API_KEY:
     logging.warning("FINNHUB_API_KEY is not set. Stock price fetches may fail.")
 
-STOCK_API_URL = "https://finnhub.io/api/v1/quote?symbol={symbol}&token={apikey}"
+# Financial Modeling Prep API Key (optional batch quote provider)
+FMP_API_KEY = os.getenv('FMP_API_KEY')
+FMP_MONTHLY_LIMIT = int(os.getenv('FMP_MONTHLY_LIMIT', 7500))
+
+# Quote providers in failover order (e.g. "finnhub,fmp" or "fake" for local testing)
+QUOTE_PROVIDERS = [name.strip() for name in os.getenv('QUOTE_PROVIDERS', 'finnhub,fmp').split(",") if name.strip()]
 
 # SQLite database file
 DB_FILE = "stocks.db"
 
+# Quote cache, snapshotted to DB_FILE so fresh quotes survive restarts
+QUOTE_CACHE_TTL = int(os.getenv('QUOTE_CACHE_TTL', 300))
+quote_cache = QuoteCache(DB_FILE, ttl=QUOTE_CACHE_TTL)
+
+# Local symbol universe used to validate symbols without spending API calls
+SYMBOL_INDEX_FILE = "symbols.idx"
+symbol_index = SymbolIndex(SYMBOL_INDEX_FILE)
+
 # Universal request tracking
 request_count = 0
 MONTHLY_LIMIT = 30000
@@ -86,6 +117,57 @@ else:
 # Thresholds for stock change alerts (default to 5% per guild)
 alert_thresholds = {}
 
+# Event loop watchdog: logs and counts callbacks that block the loop longer than this many seconds
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", 0.5))
+loop_watchdog = LoopWatchdog(threshold=LOOP_STALL_THRESHOLD)
+MAX_PROFILE_SECONDS = 60
+
+# In-memory index of every watchlist, kept current through LISTEN/NOTIFY
+watch_index = WatchIndex()
+
+# Columnar working set of the monitor, kept in step with the watch index's change log
+watch_arrays = WatchArrays()
+
+# Adaptive polling: each symbol's interval is planned from the remaining API quota
+POLL_MIN_INTERVAL = int(os.getenv("POLL_MIN_INTERVAL", 300))
+POLL_MAX_INTERVAL = int(os.getenv("POLL_MAX_INTERVAL", 4 * 3600))
+
+# The monitor visits every symbol once per POLL_MIN_INTERVAL window, a slice every SWEEP_SLICE seconds
+SWEEP_SLICE = int(os.getenv("SWEEP_SLICE", 10))
+sweep = SweepScheduler(DB_FILE, window=POLL_MIN_INTERVAL, slice_seconds=SWEEP_SLICE)
+poll_planner = PollPlanner(min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL, tolerance=SWEEP_SLICE / 2,
+                           window=sweep.window)
+
+# Backtesting: daily candles cached on disk, simulations run in a worker process
+CANDLE_CACHE_DIR = "candles"
+candle_cache = CandleCache(CANDLE_CACHE_DIR)
+backtest_pool = ProcessPoolExecutor(max_workers=1)
+BACKTEST_THRESHOLDS = [1, 2, 3, 5, 7.5, 10, 15, 20]
+DEFAULT_BACKTEST_DAYS = 365
+MAX_BACKTEST_DAYS = 730
+
+# Intraday leaderboard updated from monitor ticks and flushed to the leaderboard table
+live_leaderboard = LiveLeaderboard()
+
+# Quote provider setup
+def build_quote_providers():
+    providers = []
+    for name in QUOTE_PROVIDERS:
+        if name == "finnhub" and FINNHUB_API_KEY:
+            providers.append(FinnhubProvider(FINNHUB_API_KEY, monthly_limit=MONTHLY_LIMIT))
+        elif name == "fmp" and FMP_API_KEY:
+            providers.append(FMPProvider(FMP_API_KEY, monthly_limit=FMP_MONTHLY_LIMIT))
+        elif name == "fake":
+            providers.append(FakeProvider())
+        else:
+            logging.warning(f"Quote provider '{name}' is unknown or missing an API key. Skipping.")
+    if not providers:
+        logging.warning("No quote providers configured. Falling back to Finnhub.")
+        providers.append(FinnhubProvider(FINNHUB_API_KEY, monthly_limit=MONTHLY_LIMIT))
+    return providers
+
+quote_router = ProviderRouter(build_quote_providers(), on_request=lambda provider: update_request_count(provider))
+
 # Helper: Get reusable database connection
 def get_db_connection(retries=3, delay=2):
     for attempt in range(retries):
@@ -124,6 +206,7 @@ def initialize_db():
                         reset_date TIMESTAMP
                     )
                 """)
+                cursor.execute("ALTER TABLE api_usage ADD COLUMN IF NOT EXISTS provider TEXT NOT NULL DEFAULT 'finnhub'")
                 logging.info("API usage table checked/created.")
                 
                 # Create the settings table
@@ -148,13 +231,14 @@ def initialize_db():
                 """)
                 logging.info("Leaderboard table checked/created.")
 
-                # Initialize API usage if missing
-                cursor.execute("SELECT COUNT(*) FROM api_usage")
-                if cursor.fetchone()[0] == 0:
-                    cursor.execute(
-                        "INSERT INTO api_usage (request_count, reset_date) VALUES (%s, %s)",
-                        (0, next_reset_date())
-                    )
+                # Initialize API usage for each configured provider if missing
+                for provider in quote_router.providers:
+                    cursor.execute("SELECT COUNT(*) FROM api_usage WHERE provider = %s", (provider.name,))
+                    if cursor.fetchone()[0] == 0:
+                        cursor.execute(
+                            "INSERT INTO api_usage (request_count, reset_date, provider) VALUES (%s, %s, %s)",
+                            (0, next_reset_date(), provider.name)
+                        )
                 logging.info("API usage initialized.")
                     
                 # Create thresholds table
@@ -167,6 +251,10 @@ def initialize_db():
                 )
             """)
                 logging.info("Thresholds table checked/created.")
+
+                # Publish watchlist and threshold changes for the in-memory watch index
+                cursor.execute(WATCH_TRIGGERS_SQL)
+                logging.info("Watch index triggers checked/created.")
                 
                 conn.commit()
                 
@@ -178,18 +266,23 @@ def initialize_db():
 
 # Calculate next reset date for API requests
 def next_reset_date():
-    now = datetime.now()
-    next_month = (now.month % 12) + 1
-    year = now.year if next_month > 1 else now.year + 1
-    return datetime(year, next_month, 1).strftime("%Y-%m-%d %H:%M:%S")
+    return next_month_start(datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
 
 
-# Update API usage in the database
-def update_request_count():
+# Update API usage in the database (one row per quote provider)
+def update_request_count(provider="finnhub"):
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT request_count, reset_date FROM api_usage")
-        current_count, reset_date = cursor.fetchone()
+        cursor.execute("SELECT request_count, reset_date FROM api_usage WHERE provider = %s", (provider,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(
+                "INSERT INTO api_usage (request_count, reset_date, provider) VALUES (%s, %s, %s)",
+                (1, next_reset_date(), provider)
+            )
+            conn.commit()
+            return
+        current_count, reset_date = row
         if isinstance(reset_date, str):
             reset_date = datetime.strptime(reset_date, "%Y-%m-%d %H:%M:%S")
 
@@ -198,21 +291,66 @@ def update_request_count():
             current_count = 0
             reset_date = next_reset_date()
             cursor.execute(
-                "UPDATE api_usage SET request_count = %s, reset_date = %s",
-                (current_count, reset_date.strftime("%Y-%m-%d %H:%M:%S"))
+                "UPDATE api_usage SET request_count = %s, reset_date = %s WHERE provider = %s",
+                (current_count, reset_date, provider)
             )
+            # Keep the in-memory quota counter in step with the monthly reset
+            quote_provider = quote_router.get_provider(provider)
+            if quote_provider:
+                quote_provider.request_count = 1
+                quote_provider.reset_date = datetime.strptime(reset_date, "%Y-%m-%d %H:%M:%S")
         current_count += 1
-        cursor.execute("UPDATE api_usage SET request_count = %s", (current_count,))
+        cursor.execute("UPDATE api_usage SET request_count = %s WHERE provider = %s", (current_count, provider))
         conn.commit()
 
-def get_request_count():
+def get_request_count(provider="finnhub"):
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT request_count, reset_date FROM api_usage")
-        return cursor.fetchone()
+        cursor.execute("SELECT request_count, reset_date FROM api_usage WHERE provider = %s", (provider,))
+        return cursor.fetchone() or (0, next_reset_date())
+
+def get_all_request_counts():
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT provider, request_count, reset_date FROM api_usage ORDER BY provider")
+        return cursor.fetchall()
+
+
+# Remaining API calls across all quota-limited providers and seconds until the monthly reset.
+# Remaining calls is None when any provider is unlimited.
+def get_polling_budget():
+    remaining_calls = 0
+    for provider in quote_router.providers:
+        provider.check_reset()
+        if provider.monthly_limit is None:
+            remaining_calls = None
+            break
+        remaining_calls += max(provider.monthly_limit - provider.request_count, 0)
+    reset_date = datetime.strptime(next_reset_date(), "%Y-%m-%d %H:%M:%S")
+    return remaining_calls, (reset_date - datetime.now()).total_seconds()
+
+
+# Load persisted monthly usage into the providers so quota limits survive restarts.
+# Usage from a month that has already ended is dropped instead of carried over.
+def load_provider_usage():
+    try:
+        for row in get_all_request_counts():
+            provider = quote_router.get_provider(row["provider"])
+            if provider:
+                reset_date = row["reset_date"]
+                if isinstance(reset_date, str):
+                    reset_date = datetime.strptime(reset_date, "%Y-%m-%d %H:%M:%S")
+                provider.request_count = row["request_count"] or 0
+                if reset_date is not None:
+                    provider.reset_date = reset_date
+                provider.check_reset()
+    except Exception:
+        logging.exception("Failed to load provider usage.")
 
 
 def load_stocks(guild_id, user_id):
+    if watch_index.ready:
+        return watch_index.stocks(guild_id, user_id)
     with get_db_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute("SELECT symbol, last_price FROM stocks WHERE guild_id = %s AND user_id = %s", (guild_id, user_id))
@@ -230,6 +368,7 @@ def save_stock(guild_id, user_id, symbol, last_price=None):
                 (guild_id, user_id, symbol, last_price)
             )
             conn.commit()
+    watch_index.set_stock(guild_id, user_id, symbol, last_price)
 
         
         
@@ -241,6 +380,37 @@ def remove_stock(guild_id, user_id, symbol):
                 (guild_id, user_id, symbol)
             )
             conn.commit()
+    watch_index.remove_stock(guild_id, user_id, symbol)
+
+# Recompute a user's live leaderboard score after their watchlist shrank, from the daily
+# changes the monitor already holds. A user with no scored stocks left drops off the ranking.
+def refresh_leaderboard_score(guild_id, user_id):
+    total, count = watch_arrays.watchlist_total(guild_id, user_id, load_stocks(guild_id, user_id))
+    live_leaderboard.set_totals(guild_id, user_id, total, count)
+
+# Bulk update last_price for every watcher of each symbol. These writes skip the watch index
+# notifications, since the monitor already tracks these prices in memory.
+def save_last_prices(prices):
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL stockbot.skip_watch_notify = 'on'")
+            execute_values(cursor, """
+                UPDATE stocks SET last_price = data.price
+                FROM (VALUES %s) AS data (symbol, price)
+                WHERE stocks.symbol = data.symbol
+            """, [(symbol, float(price)) for symbol, price in prices.items()])
+            conn.commit()
+
+def set_threshold(guild_id, user_id, threshold):
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO thresholds (user_id, guild_id, threshold)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id, guild_id) DO UPDATE SET threshold = EXCLUDED.threshold
+            """, (user_id, guild_id, threshold))
+            conn.commit()
+    watch_index.set_threshold(guild_id, user_id, threshold)
 
         
 def set_update_channel(guild_id, channel_id):
@@ -263,98 +433,167 @@ def get_update_channel(guild_id):
     
 def shutdown_handler(signum, frame):
     logging.info(f"Received signal {signum}. Initiating shutdown...")
+    try:
+        quote_cache.snapshot()
+    except Exception:
+        logging.exception("Failed to snapshot quote cache on shutdown.")
     loop = asyncio.get_event_loop()
     asyncio.create_task(client.close())
     loop.stop()
     
-def calculate_daily_performance():
-    logging.info(f"Calculating daily performance for leaderboard.")
-    today = datetime.now().date()
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-
-        # Fetch distinct users and their stocks
-        cursor.execute("SELECT DISTINCT user_id, guild_id FROM stocks")
-        users = cursor.fetchall()
-
-        leaderboard_updates = []
-
-        for user in users:
-            logging.info(f"Fetching {user}")
-            user_id, guild_id = user
-            cursor.execute("""
-                SELECT symbol, last_price FROM stocks 
-                WHERE user_id = %s AND guild_id = %s
-            """, (user_id, guild_id))
-
-            stocks = cursor.fetchall()
-            total_percent_change = 0
-            count = 0
-
-            for stock in stocks:
-                logging.info(f"Parsing {user}'s Watchlist")
-                symbol, last_price = stock
-                current_price = asyncio.run(fetch_stock_price(symbol))
-
-                if current_price and last_price:
-                    percent_change = ((current_price - last_price) / last_price) * 100
-                    total_percent_change += percent_change
-                    count += 1
-
-            # Calculate average percentage change for the user
-            if count > 0:
-                avg_percent_change = total_percent_change / count
-                cursor.execute("SELECT username FROM users WHERE user_id = %s", (user_id,))
-                username = cursor.fetchone()
-                leaderboard_updates.append((today, user_id, username, guild_id, avg_percent_change))
-
-        # Insert updates into the leaderboard table
-        for update in leaderboard_updates:
-            cursor.execute("""
-                INSERT INTO leaderboard (date, user_id, username, guild_id, score)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (date, user_id, guild_id) DO UPDATE
-                SET score = EXCLUDED.score
-            """, update)
-
-        conn.commit()
-        logging.info(f"Calculation complete.")
-
-def check_rank(user_id, guild_id):
+def get_requests_message():
+    current_count, reset_date = get_request_count()
+    provider_status = "\n".join(quote_router.status() + [poll_planner.summary()])
+    return f"API requests used: {current_count}/{MONTHLY_LIMIT}\nResets on: {reset_date}\n```\n{provider_status}\n```"
+
+# Today's ranking for a guild as [(user_id, username, score)], best first: the flushed rows in
+# the leaderboard table overlaid with the live scores, so users not re-scored since a restart keep their place
+def get_today_ranking(guild_id):
+    scores = {}
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT RANK() OVER (ORDER BY score DESC) AS rank
-                FROM leaderboard
-                WHERE date = %s AND guild_id = %s AND user_id = %s
-            """, (datetime.now().date(), guild_id, user_id))
-            result = cursor.fetchone()
-            return result["rank"] if result else None
-    except Exception as e:
-        logging.exception(f"Unable to fetch ranking for user {user_id} in guild {guild_id}.")
-        return None
+            cursor.execute(
+                "SELECT user_id, username, score FROM leaderboard WHERE date = %s AND guild_id = %s",
+                (datetime.now().date(), guild_id)
+            )
+            scores = {row["user_id"]: (row["username"], row["score"]) for row in cursor.fetchall()}
+    except Exception:
+        logging.exception(f"Unable to load today's leaderboard for guild {guild_id}.")
+    for user_id in live_leaderboard.dropped_users(guild_id):
+        scores.pop(user_id, None)
+    for user_id, username, score in live_leaderboard.ranking(guild_id, limit=None):
+        scores[user_id] = (username, score)
+    ranking = [(user_id, username, score) for user_id, (username, score) in scores.items()]
+    ranking.sort(key=lambda row: row[2], reverse=True)
+    return ranking
+
+def get_leaderboard_message(guild_id):
+    leaderboard = [(username, score) for _, username, score in get_today_ranking(guild_id)[:10]]
+    if not leaderboard:
+        return "No leaderboard data available for today yet. Scores appear after the next price check."
+    result = "\n".join([f"{i+1}. {username}: {score:.2f}%" for i, (username, score) in enumerate(leaderboard)])
+    return f"**Today's Leaderboard:**\n{result}"
+
+# Bulk upsert the live leaderboard scores that changed since the last flush
+def flush_leaderboard():
+    rows = live_leaderboard.take_dirty_rows()
+    if not rows:
+        return 0
+    scored = [row for row in rows if row[4] is not None]
+    dropped = [(row[0], row[1], row[3]) for row in rows if row[4] is None]
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if scored:
+                execute_values(cursor, """
+                    INSERT INTO leaderboard (date, user_id, username, guild_id, score)
+                    VALUES %s
+                    ON CONFLICT (date, user_id, guild_id) DO UPDATE
+                    SET score = EXCLUDED.score, username = EXCLUDED.username
+                """, scored)
+            # Users whose watchlist emptied lose today's score
+            if dropped:
+                execute_values(cursor, """
+                    DELETE FROM leaderboard USING (VALUES %s) AS dropped (date, user_id, guild_id)
+                    WHERE leaderboard.date = dropped.date::date AND leaderboard.user_id = dropped.user_id
+                      AND leaderboard.guild_id = dropped.guild_id
+                """, dropped)
+            conn.commit()
+    except Exception:
+        live_leaderboard.restore_rows(rows)
+        raise
+    logging.info(f"Flushed {len(rows)} leaderboard scores.")
+    return len(rows)
+
+def check_rank(user_id, guild_id):
+    for position, (ranked_user_id, _, _) in enumerate(get_today_ranking(guild_id), start=1):
+        if ranked_user_id == user_id:
+            return position
+    return None
 
 async def update_leaderboard():
     await client.wait_until_ready()
     while not client.is_closed():
-        now = datetime.now()
-        # Run at 4:00 PM daily (market close)
-        if now.hour == 16 and now.minute == 0:
-            logging.info("Updating leaderboard...")
-            calculate_daily_performance()
-            logging.info("Leaderboard updated.")
-        await asyncio.sleep(1800)  # Check every 30 minutes
+        await asyncio.sleep(600)  # Flush every 10 minutes
+        try:
+            await asyncio.to_thread(flush_leaderboard)
+        except Exception:
+            logging.exception("Failed to flush leaderboard.")
+
+# Snapshot the quote cache periodically so a crash loses at most a few minutes of quotes
+async def snapshot_quote_cache():
+    await client.wait_until_ready()
+    while not client.is_closed():
+        await asyncio.sleep(300)
+        try:
+            await asyncio.to_thread(quote_cache.snapshot)
+        except Exception:
+            logging.exception("Failed to snapshot quote cache.")
+
+# Refresh the local symbol index once a day from the quote providers
+async def refresh_symbol_index():
+    await client.wait_until_ready()
+    while not client.is_closed():
+        try:
+            if symbol_index.is_stale():
+                logging.info("Refreshing symbol index...")
+                symbols = await quote_router.fetch_symbols()
+                if symbols:
+                    await asyncio.to_thread(symbol_index.save, symbols)
+                else:
+                    logging.warning("Symbol index refresh failed. Keeping the existing index.")
+        except Exception:
+            logging.exception("Failed to refresh symbol index.")
+        await asyncio.sleep(3600)
+
+# Helper: Split symbols into known and unknown using the local index.
+# Until the index has been built every symbol is treated as known and validated online.
+def split_known_symbols(symbols):
+    if not symbol_index.ready:
+        return list(symbols), []
+    known = [symbol for symbol in symbols if symbol in symbol_index]
+    unknown = [symbol for symbol in symbols if symbol not in symbol_index]
+    return known, unknown
+
+def invalid_symbol_message(mention, symbol):
+    message = (f"Hey {mention}, womp womp:\n{symbol} is not a valid stock.\nMake sure the stock is available on NASDAQ\n"
+               f"If you need additional support go here: https://www.dummies.com/category/books/reading-33710/")
+    suggestions = symbol_index.suggest(symbol) if symbol_index.ready else []
+    if suggestions:
+        message += f"\nDid you mean: {', '.join(suggestions)}?"
+    return message
 
 async def shutdown():
     await client.close()
+    await quote_router.close()
     tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
     [task.cancel() for task in tasks]
     await asyncio.gather(*tasks, return_exceptions=True)
 
+# Long-running tasks by name. on_ready fires again after every reconnect, so each one is only
+# started if it is not already running.
+background_tasks = {}
+commands_synced = False
+
+def start_background_task(name, coroutine_function):
+    task = background_tasks.get(name)
+    if task is None or task.done():
+        background_tasks[name] = asyncio.create_task(coroutine_function(), name=name)
+
 @client.event
 async def on_ready():
+    global commands_synced
     logging.info(f"Logged in as {client.user}")
+    loop_watchdog.start()
+
+    if not commands_synced:
+        try:
+            synced = await tree.sync()
+            commands_synced = True
+            logging.info(f"Synced {len(synced)} slash commands.")
+        except discord.HTTPException:
+            logging.exception("Failed to sync slash commands.")
     
         # Fetch all guilds where the bot is a member
     guilds = client.guilds
@@ -379,8 +618,11 @@ async def on_ready():
         except Exception as e:
             logging.exception(f"Failed to send update message for guild {guild.name}: {e}")
 
-    asyncio.create_task(monitor_stock_changes())
-    asyncio.create_task(update_leaderboard())
+    start_background_task("watch_index", lambda: watch_index.listen(get_db_connection))
+    start_background_task("monitor", monitor_stock_changes)
+    start_background_task("leaderboard", update_leaderboard)
+    start_background_task("symbol_index", refresh_symbol_index)
+    start_background_task("quote_cache", snapshot_quote_cache)
 
 @client.event
 async def on_message(message):
@@ -406,8 +648,12 @@ async def on_message(message):
             "9. **!leaderboard** - Displays the leaderboard for today, showing users with the best-performing watchlists.\n\n"
             "10. **!69** - Gives you a nice compliment.\n\n"
             "11. **!imbored** - For when you're bored.\n\n"
-            "12. **!help** - Displays this help message.\n\n"
-            "```Once a stock is added to your watchlist, the bot will monitor its price. Daily performance is tracked, and the leaderboard is updated at market close.```"
+            "12. **!backtest [PERCENTAGE] [DAYS]** - Shows how many alerts different thresholds would have sent for your watchlist (e.g., `!backtest 5 180`).\n\n"
+            "13. **!stalls** - (Admin) Shows event loop lag and the code that blocked it most often.\n\n"
+            "14. **!profile SECONDS** - (Admin) Profiles the bot for up to 60 seconds and uploads flame graph data.\n\n"
+            "15. **!help** - Displays this help message.\n\n"
+            "All of these stock commands are also available as slash commands, e.g. `/watchlist`.\n\n"
+            "```Once a stock is added to your watchlist, the bot will monitor its price. Daily performance is tracked, and the leaderboard updates live as prices are checked.```"
         )
         await message.channel.send(help_message)
         logging.info(f"HELP command received from {message.author}: {message.content}")
@@ -434,6 +680,33 @@ async def on_message(message):
             logging.info(f"Bot Restart command FAILED from {message.author}: {message.content}")
             await message.channel.send(f"Failed to restart: {response.status_code} - {response.text}")
 
+    if message.content.startswith("!stalls"):
+        if not message.author.guild_permissions.administrator:
+            await message.channel.send("Only server administrators can use this command.")
+            return
+        logging.info(f"{message.author} checked event loop stalls")
+        await message.channel.send(f"```\n{loop_watchdog.summary()}\n```")
+
+    if message.content.startswith("!profile"):
+        if not message.author.guild_permissions.administrator:
+            await message.channel.send("Only server administrators can use this command.")
+            return
+        parts = message.content.split()
+        if len(parts) > 1 and not parts[1].isdigit():
+            await message.channel.send(f"Usage: `!profile SECONDS` (1-{MAX_PROFILE_SECONDS}).")
+            return
+        seconds = min(max(int(parts[1]) if len(parts) > 1 else 10, 1), MAX_PROFILE_SECONDS)
+        logging.info(f"{message.author} started a {seconds}s profile")
+        await message.channel.send(f"Profiling the event loop for {seconds} seconds...")
+
+        # Sample the loop thread from a worker thread so the loop keeps running normally
+        folded = await asyncio.to_thread(profile_thread, threading.get_ident(), seconds)
+        profile_file = discord.File(io.BytesIO(folded.encode()), filename=f"profile-{int(time.time())}.folded")
+        await message.channel.send(
+            "Profile complete. Open it in https://www.speedscope.app or run it through flamegraph.pl.",
+            file=profile_file
+        )
+
     if message.content.startswith("!addstocks"):
         logging.info(f"Command received from {message.author}: {message.content}")
         parts = message.content.split()[1:]
@@ -444,9 +717,11 @@ async def on_message(message):
         added_stocks = []
         invalid_stocks = []
 
-        for stock_symbol in parts:
-            stock_symbol = stock_symbol.upper()
-            current_price = await fetch_stock_price(stock_symbol)
+        symbols, invalid_stocks = split_known_symbols(list(dict.fromkeys(stock_symbol.upper() for stock_symbol in parts)))
+        prices = await fetch_stock_prices(symbols) if symbols else {}
+
+        for stock_symbol in symbols:
+            current_price = prices.get(stock_symbol)
 
             if current_price is None:
                 invalid_stocks.append(stock_symbol)
@@ -459,7 +734,27 @@ async def on_message(message):
             await message.channel.send(f"{message.author.mention} added ```{', '.join(added_stocks)}``` to their watchlist.")
         if invalid_stocks:
             logging.info(f"{message.author} FAILED to add INVALID stocks to watchlist: {', '.join(invalid_stocks)}")
-            await message.channel.send(f"Invalid symbols: {', '.join(invalid_stocks)}")
+            invalid_lines = []
+            for symbol in invalid_stocks:
+                suggestions = symbol_index.suggest(symbol) if symbol_index.ready else []
+                invalid_lines.append(f"{symbol} (did you mean {', '.join(suggestions)}?)" if suggestions else symbol)
+            await message.channel.send(f"Invalid symbols: {', '.join(invalid_lines)}")
+
+    if message.content.startswith("!backtest"):
+        logging.info(f"Command received from {message.author}: {message.content}")
+        parts = message.content.split()
+        try:
+            percentage = float(parts[1]) if len(parts) > 1 else None
+            days = int(parts[2]) if len(parts) > 2 else DEFAULT_BACKTEST_DAYS
+        except ValueError:
+            await message.channel.send(f"Usage: `!backtest [PERCENTAGE] [DAYS]` (e.g., `!backtest 5 180`).")
+            return
+        if (percentage is not None and not 0 < percentage <= 100) or not 7 <= days <= MAX_BACKTEST_DAYS:
+            await message.channel.send(f"Usage: `!backtest [PERCENTAGE] [DAYS]` with a percentage up to 100 and 7-{MAX_BACKTEST_DAYS} days.")
+            return
+        async with message.channel.typing():
+            result = await run_backtest(guild_id, user_id, percentage, days)
+        await message.channel.send(f"{message.author.mention} {result}")
 
     if message.content.startswith("!setchannel"):
         logging.info(f"Command received from {message.author}: {message.content}")
@@ -475,15 +770,7 @@ async def on_message(message):
             return
 
         threshold = float(parts[1])
-
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO thresholds (user_id, guild_id, threshold)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (user_id, guild_id) DO UPDATE SET threshold = EXCLUDED.threshold
-            """, (user_id, guild_id, threshold))
-            conn.commit()
+        set_threshold(guild_id, user_id, threshold)
 
         logging.info(f"Threshold set to {threshold}% for user {message.author} in guild {guild_id}.")
         await message.channel.send(f"{message.author.mention} set his watchlist notification threshold to {threshold}%.")
@@ -498,10 +785,15 @@ async def on_message(message):
             return
 
         stock_symbol = parts[1].upper()
+        if split_known_symbols([stock_symbol])[1]:
+            logging.info(f"{message.author} tried to add an UNKNOWN stock to watchlist: {message.content}")
+            await message.channel.send(invalid_symbol_message(message.author.mention, stock_symbol))
+            return
+
         current_price = await fetch_stock_price(stock_symbol)
         if current_price is None or current_price == 0:
             logging.info(f"{message.author} tried to add an INVALID stock to watchlist: {message.content}")
-            await message.channel.send(f"Hey {message.author.mention}, womp womp:\n{stock_symbol} is not a valid stock.\nMake sure the stock is available on NASDAQ\nIf you need additional support go here: https://www.dummies.com/category/books/reading-33710/")
+            await message.channel.send(invalid_symbol_message(message.author.mention, stock_symbol))
             return
 
         tracked_stocks = load_stocks(guild_id, user_id)
@@ -522,6 +814,10 @@ async def on_message(message):
             return
 
         stock_symbol = parts[1].upper()
+        if split_known_symbols([stock_symbol])[1]:
+            logging.info(f"{message.author} tried to check the price of an UNKNOWN stock: {stock_symbol}")
+            await message.channel.send(invalid_symbol_message(message.author.mention, stock_symbol))
+            return
 
         # Fetch stock price
         stock_price = await fetch_stock_price(stock_symbol)
@@ -531,7 +827,7 @@ async def on_message(message):
             await message.channel.send(f"The current price of {stock_symbol} is ${stock_price:.2f}.")
         else:
             logging.info(f"{message.author} tried to check the price of an INVALID stock: {stock_symbol}")
-            await message.channel.send(f"Hey {message.author.mention}, womp womp:\n{stock_symbol} is not a valid stock.\nMake sure the stock is available on NASDAQ\nIf you need additional support go here: https://www.dummies.com/category/books/reading-33710/")
+            await message.channel.send(invalid_symbol_message(message.author.mention, stock_symbol))
 
     if message.content.startswith("!69"):
         logging.info(f"{message.author} asked for a compliment")
@@ -551,6 +847,7 @@ async def on_message(message):
 
         if stock_symbol in tracked_stocks:
             remove_stock(guild_id, user_id, stock_symbol)
+            refresh_leaderboard_score(guild_id, user_id)
             logging.info(f"{message.author} successfully removed {stock_symbol} from watchlist")
             await message.channel.send(f"{message.author.mention} removed {stock_symbol} from their watchlist.")
         else:
@@ -567,8 +864,9 @@ async def on_message(message):
                 await message.channel.send(f"Hey {message.author.mention}, your watchlist is empty.\nTry using ```!addstock SYMBOL``` or ```!addstocks SYMBOL SYMBOL ...```")
             else:
                 watchlist_lines = []
+                prices = await fetch_stock_prices(list(tracked_stocks))
                 for symbol, last_price in tracked_stocks.items():
-                    current_price = await fetch_stock_price(symbol)
+                    current_price = prices.get(symbol)
                     if current_price is not None:
                         logging.info(f"WATCHLIST REQUEST: Checked price for {symbol}")
                         watchlist_lines.append(f"{symbol}: ${current_price:.2f}")
@@ -597,25 +895,245 @@ async def on_message(message):
         await message.channel.send(activity)
     
     if message.content.startswith("!requests"):
-        current_count, reset_date = get_request_count()
         logging.info(f"{message.author} checked API request limit")
-        await message.channel.send(f"API requests used: {current_count}/{MONTHLY_LIMIT}\nResets on: {reset_date}")
+        await message.channel.send(get_requests_message())
 
     if message.content.startswith("!leaderboard"):
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT username, score FROM leaderboard
-                WHERE date = %s AND guild_id = %s
-                ORDER BY score DESC LIMIT 10
-            """, (datetime.now().date(), message.guild.id))
-
-            leaderboard = cursor.fetchall()
-            if leaderboard:
-                result = "\n".join([f"{i+1}. {row['username']}: {row['score']:.2f}%" for i, row in enumerate(leaderboard)])
-                await message.channel.send(f"**Today's Leaderboard:**\n{result}")
-            else:
-                await message.channel.send("No leaderboard data available for today. Please wait 24hrs for results to populate.")
+        # Users missing from the client cache are listed as mentions, which should not ping them
+        await message.channel.send(get_leaderboard_message(message.guild.id), allowed_mentions=discord.AllowedMentions.none())
+
+
+# Replay a user's watchlist against cached daily candles and report how many alerts each threshold would have sent
+async def run_backtest(guild_id, user_id, percentage=None, days=DEFAULT_BACKTEST_DAYS):
+    tracked_stocks = load_stocks(guild_id, user_id)
+    if not tracked_stocks:
+        return "Your watchlist is empty, so there is nothing to backtest."
+    percentage = watch_index.get_threshold(guild_id, user_id) if percentage is None else percentage
+    thresholds = sorted(set(BACKTEST_THRESHOLDS) | {percentage})
+
+    # Fetch missing candles a few symbols at a time, everything else comes from the local cache
+    semaphore = asyncio.Semaphore(5)
+    async def load_candles(symbol):
+        async with semaphore:
+            return await candle_cache.fetch(symbol, days, quote_router.fetch_candles)
+    results = await asyncio.gather(*(load_candles(symbol) for symbol in tracked_stocks))
+    symbols = [symbol for symbol, candles in zip(tracked_stocks, results) if candles is not None and len(candles[1]) > 1]
+    closes = [candles[1] for candles in results if candles is not None and len(candles[1]) > 1]
+    if not closes:
+        return "Couldn't fetch price history for your watchlist. Please try again later."
+
+    loop = asyncio.get_running_loop()
+    totals, per_symbol = await loop.run_in_executor(backtest_pool, simulate_alerts, closes, thresholds)
+
+    weeks = days / 7
+    lines = ["Threshold | Alerts | Per week"]
+    for i, threshold in enumerate(thresholds):
+        marker = " <- you" if threshold == percentage else ""
+        lines.append(f"{threshold:>8.1f}% | {totals[i]:>6} | {totals[i] / weeks:>8.1f}{marker}")
+
+    chosen = thresholds.index(percentage)
+    noisiest = sorted(zip(symbols, per_symbol[:, chosen]), key=lambda item: item[1], reverse=True)[:5]
+    noisiest_message = ", ".join(f"{symbol} ({count})" for symbol, count in noisiest if count)
+    skipped = len(tracked_stocks) - len(symbols)
+    return (f"Backtest of {len(symbols)} stocks over the last {days} days of daily closes:\n```\n" + "\n".join(lines) + "\n```"
+            + (f"\nMost alerts at {percentage}%: {noisiest_message}" if noisiest_message else "")
+            + (f"\nSkipped {skipped} stocks without price history." if skipped else ""))
+
+
+# Slash commands
+# Slow commands defer straight away, then edit their reply as results come in.
+
+# Helper: Edit a deferred reply at most once per `interval` seconds, always sending the final state
+class ProgressiveReply:
+    def __init__(self, interaction, interval=1.0):
+        self.interaction = interaction
+        self.interval = interval
+        self.last_edit = 0
+
+    async def update(self, content, final=False):
+        now = time.monotonic()
+        if not final and now - self.last_edit < self.interval:
+            return
+        self.last_edit = now
+        await self.interaction.edit_original_response(content=content)
+
+
+def render_watchlist(mention, lines, rank_message, pending):
+    watchlist = "\n".join(lines.values())
+    status = f"\nFetching {pending} fresh prices..." if pending else ""
+    return f"{mention}'s watchlist:\n```\n{watchlist}\n```\n{rank_message}{status}"
+
+
+@tree.command(name="watchlist", description="Show your watchlist with the latest prices.")
+@app_commands.guild_only()
+async def watchlist_command(interaction: discord.Interaction):
+    await interaction.response.defer(thinking=True)
+    logging.info(f"Slash command /watchlist received from {interaction.user}")
+    guild_id, user_id = interaction.guild_id, interaction.user.id
+    mention = interaction.user.mention
+
+    tracked_stocks = load_stocks(guild_id, user_id)
+    if not tracked_stocks:
+        await interaction.edit_original_response(content=f"Hey {mention}, your watchlist is empty.\nTry using `/addstock` or `/addstocks`.")
+        return
+
+    user_rank = check_rank(user_id, guild_id)
+    rank_message = f"{interaction.user}'s current leaderboard ranking: {user_rank}" if user_rank else "You are not currently ranked."
+
+    # Show whatever is cached first, then fill in fresh prices batch by batch
+    lines = {}
+    stale = []
+    for symbol in tracked_stocks:
+        cached = quote_cache.peek(symbol)
+        if cached:
+            quote, fetched_at = cached
+            age = int((time.time() - fetched_at) / 60)
+            lines[symbol] = f"{symbol}: ${quote.price:.2f}" + (f" ({age} min ago)" if age else "")
+        else:
+            lines[symbol] = f"{symbol}: loading..."
+        if quote_cache.get(symbol) is None:
+            stale.append(symbol)
+
+    reply = ProgressiveReply(interaction)
+    await reply.update(render_watchlist(mention, lines, rank_message, len(stale)), final=not stale)
+
+    batch_size = max(1, int(1 / quote_router.cost_per_symbol()))
+    for i in range(0, len(stale), batch_size):
+        batch = stale[i:i + batch_size]
+        prices = await fetch_stock_prices(batch)
+        for symbol in batch:
+            lines[symbol] = f"{symbol}: ${prices[symbol]:.2f}" if symbol in prices else f"{symbol}: Unable to fetch current price."
+        pending = len(stale) - i - len(batch)
+        await reply.update(render_watchlist(mention, lines, rank_message, pending), final=not pending)
+    logging.info(f"{interaction.user} checked their watchlist")
+
+
+@tree.command(name="price", description="Show the current price of a stock.")
+@app_commands.describe(symbol="Stock symbol, e.g. AAPL")
+async def price_command(interaction: discord.Interaction, symbol: str):
+    symbol = symbol.upper()
+    if split_known_symbols([symbol])[1]:
+        await interaction.response.send_message(invalid_symbol_message(interaction.user.mention, symbol))
+        return
+
+    cached = quote_cache.get(symbol)
+    if cached:
+        await interaction.response.send_message(f"The current price of {symbol} is ${cached.price:.2f}.")
+        return
+
+    await interaction.response.defer(thinking=True)
+    stock_price = await fetch_stock_price(symbol)
+    if stock_price is not None:
+        await interaction.edit_original_response(content=f"The current price of {symbol} is ${stock_price:.2f}.")
+    else:
+        await interaction.edit_original_response(content=invalid_symbol_message(interaction.user.mention, symbol))
+
+
+@tree.command(name="addstock", description="Add a stock to your watchlist.")
+@app_commands.describe(symbol="Stock symbol, e.g. AAPL")
+@app_commands.guild_only()
+async def addstock_command(interaction: discord.Interaction, symbol: str):
+    await add_stocks_from_interaction(interaction, symbol)
+
+
+@tree.command(name="addstocks", description="Add several stocks to your watchlist at once.")
+@app_commands.describe(symbols="Stock symbols separated by spaces, e.g. AAPL TSLA AMZN")
+@app_commands.guild_only()
+async def addstocks_command(interaction: discord.Interaction, symbols: str):
+    await add_stocks_from_interaction(interaction, symbols)
+
+
+async def add_stocks_from_interaction(interaction, symbols):
+    await interaction.response.defer(thinking=True)
+    logging.info(f"Slash command add received from {interaction.user}: {symbols}")
+    guild_id, user_id = interaction.guild_id, interaction.user.id
+    mention = interaction.user.mention
+
+    requested = list(dict.fromkeys(symbol.upper() for symbol in symbols.split()))
+    known, invalid_stocks = split_known_symbols(requested)
+    tracked_stocks = load_stocks(guild_id, user_id)
+    already_tracked = [symbol for symbol in known if symbol in tracked_stocks]
+    to_add = [symbol for symbol in known if symbol not in tracked_stocks]
+
+    prices = await fetch_stock_prices(to_add) if to_add else {}
+    added_stocks = []
+    for symbol in to_add:
+        if symbol in prices:
+            save_stock(guild_id, user_id, symbol, prices[symbol])
+            added_stocks.append(symbol)
+        else:
+            invalid_stocks.append(symbol)
+
+    lines = []
+    if added_stocks:
+        logging.info(f"{interaction.user} added to watchlist {', '.join(added_stocks)}")
+        lines.append(f"{mention} added `{', '.join(added_stocks)}` to their watchlist.")
+    if already_tracked:
+        lines.append(f"Already on your watchlist: {', '.join(already_tracked)}")
+    for symbol in invalid_stocks:
+        lines.append(invalid_symbol_message(mention, symbol))
+    await interaction.edit_original_response(content="\n\n".join(lines) or "Nothing to add.")
+
+
+@tree.command(name="removestock", description="Remove a stock from your watchlist.")
+@app_commands.describe(symbol="Stock symbol, e.g. TSLA")
+@app_commands.guild_only()
+async def removestock_command(interaction: discord.Interaction, symbol: str):
+    # Acknowledge first: the database calls below can retry for longer than Discord's 3s limit
+    await interaction.response.defer()
+    symbol = symbol.upper()
+    guild_id, user_id = interaction.guild_id, interaction.user.id
+    if symbol in await asyncio.to_thread(load_stocks, guild_id, user_id):
+        # Runs on the loop, since it also updates the watch index the monitor reads
+        remove_stock(guild_id, user_id, symbol)
+        refresh_leaderboard_score(guild_id, user_id)
+        logging.info(f"{interaction.user} successfully removed {symbol} from watchlist")
+        await interaction.edit_original_response(content=f"{interaction.user.mention} removed {symbol} from their watchlist.")
+    else:
+        await interaction.edit_original_response(content=f"{symbol} is not on your watchlist.")
+
+
+@tree.command(name="set", description="Set the percentage change that triggers your stock alerts.")
+@app_commands.describe(percentage="Alert threshold in percent, e.g. 10")
+@app_commands.guild_only()
+async def set_command(interaction: discord.Interaction, percentage: app_commands.Range[float, 0.1, 100.0]):
+    await interaction.response.defer()
+    set_threshold(interaction.guild_id, interaction.user.id, percentage)
+    logging.info(f"Threshold set to {percentage}% for user {interaction.user} in guild {interaction.guild_id}.")
+    await interaction.edit_original_response(content=f"{interaction.user.mention} set their watchlist notification threshold to {percentage}%.")
+
+
+@tree.command(name="setchannel", description="Send stock alerts and updates to this channel.")
+@app_commands.guild_only()
+async def setchannel_command(interaction: discord.Interaction):
+    await interaction.response.defer()
+    await asyncio.to_thread(set_update_channel, interaction.guild_id, interaction.channel_id)
+    logging.info(f"{interaction.user} set active bot channel to {interaction.guild_id, interaction.channel_id}")
+    await interaction.edit_original_response(content=f"Updates will be sent to this channel: {interaction.channel.mention}")
+
+
+@tree.command(name="backtest", description="Count how many alerts each threshold would have sent for your watchlist.")
+@app_commands.describe(percentage="Threshold to highlight (defaults to yours)", days=f"Days of history (up to {MAX_BACKTEST_DAYS})")
+@app_commands.guild_only()
+async def backtest_command(interaction: discord.Interaction, percentage: app_commands.Range[float, 0.1, 100.0] = None,
+                           days: app_commands.Range[int, 7, MAX_BACKTEST_DAYS] = DEFAULT_BACKTEST_DAYS):
+    await interaction.response.defer(thinking=True)
+    logging.info(f"Slash command /backtest received from {interaction.user}: {percentage}% over {days} days")
+    await interaction.edit_original_response(content=await run_backtest(interaction.guild_id, interaction.user.id, percentage, days))
+
+
+@tree.command(name="leaderboard", description="Show today's best-performing watchlists.")
+@app_commands.guild_only()
+async def leaderboard_command(interaction: discord.Interaction):
+    await interaction.response.defer()
+    message = await asyncio.to_thread(get_leaderboard_message, interaction.guild_id)
+    await interaction.edit_original_response(content=message, allowed_mentions=discord.AllowedMentions.none())
+
+
+@tree.command(name="requests", description="Show API usage for the month.")
+async def requests_command(interaction: discord.Interaction):
+    await interaction.response.defer()
+    await interaction.edit_original_response(content=await asyncio.to_thread(get_requests_message))
 
 
 async def get_random_compliment():
@@ -741,103 +1259,138 @@ async def get_random_compliment():
 ]
     return random.choice(compliments)
     
-# Fetch stock price with retry logic
-async def fetch_stock_price(symbol, retries=3, delay=2):
-    for attempt in range(retries):
-        try:
-            update_request_count()
-            response = requests.get(STOCK_API_URL.format(symbol=symbol, apikey=FINNHUB_API_KEY), timeout=10)
-            response.raise_for_status()
-            data = response.json()
+# Fetch quotes for many symbols, serving fresh ones from the quote cache and fetching the rest
+# with batching, retries and provider failover
+async def fetch_stock_quotes(symbols, retries=3, delay=2, max_age=None):
+    quotes, missing = quote_cache.get_many(list(dict.fromkeys(symbols)), max_age)
+    if not missing:
+        return quotes
+    try:
+        fetched = await quote_router.fetch_quotes(missing, retries=retries, delay=delay)
+    except Exception as e:
+        logging.exception(f"Unexpected error fetching quotes for {len(missing)} symbols: {e}")
+        return quotes
+    quote_cache.put_many(fetched)
+    quotes.update(fetched)
+    return quotes
 
-            # Log the API response for debugging
-            logging.info(f"API response for {symbol}: {data}")
+# Fetch current prices for many symbols. Invalid or unavailable symbols are left out.
+async def fetch_stock_prices(symbols, retries=3, delay=2, max_age=None):
+    quotes = await fetch_stock_quotes(symbols, retries=retries, delay=delay, max_age=max_age)
+    return {symbol: quote.price for symbol, quote in quotes.items()}
 
-            # Validate the response based on the API's behavior
-            if data.get("c", 0) > 0:  # "c" is the current price
-                return data["c"]
-            else:
-                logging.warning(f"Invalid stock symbol: {symbol}. API returned: {data}")
-                return None  # Invalid stock symbol
-        except requests.exceptions.RequestException as e:
-            logging.warning(f"Request error for {symbol} (attempt {attempt + 1}/{retries}): {e}")
-            if attempt < retries - 1:
-                await asyncio.sleep(delay)
-        except Exception as e:
-            logging.exception(f"Unexpected error for {symbol}: {e}")
-            return None
-    return None
+# Fetch stock price with retry logic
+async def fetch_stock_price(symbol, retries=3, delay=2, max_age=None):
+    prices = await fetch_stock_prices([symbol], retries=retries, delay=delay, max_age=max_age)
+    return prices.get(symbol)
 
 
     
 # Monitor stock changes
 async def monitor_stock_changes():
     await client.wait_until_ready()
+    await watch_index.wait_ready()
+    poll_planner.restore_last_polled(await asyncio.to_thread(sweep.load))
+    sorted_symbols = []
     while not client.is_closed():
-        logging.debug("Starting stock monitoring iteration.")
+        await sweep.wait_for_slice()
         try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT DISTINCT guild_id FROM stocks")
-                guild_ids = [row["guild_id"] for row in cursor.fetchall()]
-
-                for guild_id in guild_ids:
-                    channel_id = get_update_channel(guild_id)
-                    if not channel_id:
-                        logging.debug(f"Skipping guild {guild_id}: No update channel set.")
-                        continue
-
-                    channel = client.get_channel(channel_id)
-                    if not channel:
-                        continue
-
-                    # Fetch distinct users for the guild
-                    cursor.execute("SELECT DISTINCT user_id FROM stocks WHERE guild_id = %s", (guild_id,))
-                    user_ids = [row["user_id"] for row in cursor.fetchall()]
-
-                    for user_id in user_ids:
-                        # Fetch user's threshold
-                        cursor.execute("""
-                            SELECT threshold FROM thresholds 
-                            WHERE user_id = %s AND guild_id = %s
-                        """, (user_id, guild_id))
-                        threshold_row = cursor.fetchone()
-                        threshold = threshold_row["threshold"] if threshold_row else 5  # Default 5%
-
-                        cursor.execute("""
-                            SELECT symbol, last_price FROM stocks 
-                            WHERE guild_id = %s AND user_id = %s
-                        """, (guild_id, user_id))
-                        stocks = cursor.fetchall()
-
-                        for row in stocks:
-                            symbol = row["symbol"]
-                            last_price = row["last_price"]
-                            current_price = await fetch_stock_price(symbol)
-
-                            if current_price and last_price:
-                                percent_change = ((current_price - last_price) / last_price) * 100
-                                if abs(percent_change) >= threshold:
-                                    logging.info(f"Stock alert triggered for {symbol}: {percent_change:.2f}% change.")
-                                    await channel.send(
-                                        f"⚠️ Stock Alert for <@{user_id}>! {symbol} changed by {percent_change:.2f}% "
-                                        f"and is now ${current_price:.2f}."
-                                    )
-
-                                # Update the last known price in the database
-                                cursor.execute(
-                                    "UPDATE stocks SET last_price = %s WHERE guild_id = %s AND user_id = %s AND symbol = %s",
-                                    (current_price, guild_id, user_id, symbol)
-                                )
-                        conn.commit()
+            # Apply watchlist changes made since the last slice to the arrays
+            changed = watch_arrays.sync(watch_index)
+            new_window = sweep.starts_window()
+
+            # New rows (and every row after a restart) start from today's cached quotes,
+            # so scores cover the whole watchlist before each symbol is polled again
+            if changed and watch_arrays.seed_day_changes(quote_cache.day_changes()):
+                publish_scores(list(range(len(watch_arrays.symbols))))
+
+            # Re-plan polling intervals from the remaining quota and each symbol's activity once per window
+            if changed or new_window:
+                watchers, min_threshold = watch_arrays.symbol_stats()
+                watched = {symbol: (int(watchers[i]), float(min_threshold[i]))
+                           for i, symbol in enumerate(watch_arrays.symbols) if watchers[i]}
+                remaining_calls, seconds_left = get_polling_budget()
+                poll_planner.plan(watched, remaining_calls, seconds_left, quote_router.cost_per_symbol())
+                poll_planner.prune(watched)
+                sorted_symbols = sorted(watched)
+
+            # Visit the next share of symbols after the cursor and check the ones that are due
+            batch_size = max(1, int(1 / quote_router.cost_per_symbol()))
+            slice_symbols = sweep.next_slice(sorted_symbols, min_size=batch_size)
+            due_symbols = [symbol for symbol in slice_symbols if poll_planner.is_due(symbol, now=sweep.slice_start)]
+            quoted_symbols = []
+            if due_symbols:
+                logging.debug(f"Monitor slice {sweep.tick}: {len(due_symbols)}/{len(slice_symbols)} symbols due.")
+                quoted_symbols = await check_symbols(due_symbols, polled_at=sweep.slice_start)
+            if slice_symbols:
+                await asyncio.to_thread(sweep.save, quoted_symbols)
         except Exception as e:
             logging.exception("Error in monitor_stock_changes loop")
-        await asyncio.sleep(1800)
-        logging.debug("Sleeping for 1800 seconds before next iteration.")
-        
+
+# Push the leaderboard scores of every watchlist holding one of the given symbol ids
+def publish_scores(symbol_ids):
+    for (guild_id, user_id), total, count in watch_arrays.group_totals(symbol_ids):
+        user = client.get_user(user_id)
+        live_leaderboard.set_totals(guild_id, user_id, total, count, username=user.display_name if user else None)
+
+# Quote a set of symbols and alert, score and record every row watching them.
+# Returns the symbols that were quoted; the rest stay due and are retried on the next pass.
+# polled_at is the monotonic time the poll counts from (the slice's scheduled start).
+async def check_symbols(symbols, polled_at=None):
+    # Quote the due symbols in a few batched calls
+    quotes = await fetch_stock_quotes(symbols)
+    poll_planner.mark_polled(quotes.keys(), now=polled_at)
+    logging.debug(f"Checked {len(quotes)}/{len(symbols)} due symbols.")
+
+    watch_arrays.sync(watch_index)
+    current = watch_arrays.symbol_array({symbol: quote.price for symbol, quote in quotes.items()})
+    prev_close = watch_arrays.symbol_array({symbol: quote.prev_close for symbol, quote in quotes.items()})
+    alerts, percent_change = watch_arrays.evaluate(current, prev_close)
+
+    # Only rows that crossed their threshold become alert messages
+    channels = {}
+    for row in alerts:
+        guild_id, user_id = int(watch_arrays.guild[row]), int(watch_arrays.user[row])
+        if guild_id not in channels:
+            channel_id = get_update_channel(guild_id)
+            channels[guild_id] = client.get_channel(channel_id) if channel_id else None
+        channel = channels[guild_id]
+        if not channel:
+            logging.debug(f"No update channel for guild {guild_id}: alerts disabled.")
+            continue
+        symbol = watch_arrays.symbols[watch_arrays.sym[row]]
+        logging.info(f"Stock alert triggered for {symbol}: {percent_change[row]:.2f}% change.")
+        await channel.send(
+            f"⚠️ Stock Alert for <@{user_id}>! {symbol} changed by {percent_change[row]:.2f}% "
+            f"and is now ${current[watch_arrays.sym[row]]:.2f}."
+        )
+
+    # Feed the planner how volatile each symbol is and how close it came to a threshold
+    proximity = watch_arrays.symbol_proximity(percent_change)
+    quoted_ids = []
+    for symbol, quote in quotes.items():
+        symbol_id = watch_arrays.symbol_ids.get(symbol)
+        if symbol_id is not None:
+            quoted_ids.append(symbol_id)
+            poll_planner.observe(symbol, quote.price, float(proximity[symbol_id]))
+
+    # Leaderboard scores are the average daily change against the previous close
+    publish_scores(quoted_ids)
+
+    # Every watcher of a symbol now shares its latest price, so update last_price once per symbol
+    if quotes:
+        await asyncio.to_thread(save_last_prices, {symbol: quote.price for symbol, quote in quotes.items()})
+    return list(quotes)
+
 async def main(token):
-    async with client:
-        await client.start(token)
+    try:
+        async with client:
+            await client.start(token)
+    finally:
+        await quote_router.close()
+        quote_cache.snapshot()
+        flush_leaderboard()
+        backtest_pool.shutdown(wait=False, cancel_futures=True)
 
 # Main Script
 token = os.getenv('TOKEN')
@@ -847,6 +1400,11 @@ if not token:
 
 if __name__ == "__main__":
     initialize_db()
+    load_provider_usage()
+    symbol_index.load()
+    quote_cache.load()
+    # Start the backtest worker now, while the process is still single threaded and safe to fork
+    backtest_pool.submit(simulate_alerts, [], BACKTEST_THRESHOLDS).result()
     # Register signal handlers
     signal.signal(signal.SIGINT, shutdown_handler)
     signal.signal(signal.SIGTERM, shutdown_handler)
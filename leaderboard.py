@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime
+
+
+# Intraday leaderboard maintained incrementally from monitor ticks.
+# Each user's score is the average daily percent change across their watchlist. The monitor keeps
+# the per-symbol changes and replaces a user's whole aggregate whenever one of their symbols is quoted.
+# Users whose watchlist emptied today are kept in `dropped` so their stored score can be removed too.
+class LiveLeaderboard:
+    def __init__(self):
+        self.date = datetime.now().date()
+        self.totals = {}     # (guild_id, user_id) -> [sum of percent changes, count]
+        self.usernames = {}  # user_id -> display name
+        self.dropped = set()
+        self.dirty = set()
+        self.pending = []    # rows from a finished day that have not been flushed yet
+        self.lock = threading.Lock()
+
+    # Start a fresh day, keeping the previous day's unflushed scores for the next flush
+    def roll_over(self, today=None):
+        today = today or datetime.now().date()
+        if today == self.date:
+            return
+        self.pending.extend(self.rows(self.dirty))
+        self.date = today
+        self.totals = {}
+        self.dropped = set()
+        self.dirty = set()
+
+    # Replace a user's aggregate. A count of 0 drops the user from today's ranking.
+    def set_totals(self, guild_id, user_id, total, count, username=None):
+        with self.lock:
+            self.roll_over()
+            key = (guild_id, user_id)
+            if count:
+                self.totals[key] = [total, count]
+                self.dropped.discard(key)
+            else:
+                self.totals.pop(key, None)
+                self.dropped.add(key)
+            if username:
+                self.usernames[user_id] = username
+            self.dirty.add(key)
+
+    def score(self, guild_id, user_id):
+        total = self.totals.get((guild_id, user_id))
+        return total[0] / total[1] if total and total[1] else None
+
+    # Top users for a guild as (user_id, username, score), best first
+    def ranking(self, guild_id, limit=10):
+        with self.lock:
+            self.roll_over()
+            scores = [(user_id, self.username(user_id), total[0] / total[1])
+                      for (g_id, user_id), total in self.totals.items() if g_id == guild_id and total[1]]
+        scores.sort(key=lambda row: row[2], reverse=True)
+        return scores[:limit] if limit else scores
+
+    def dropped_users(self, guild_id):
+        with self.lock:
+            self.roll_over()
+            return {user_id for g_id, user_id in self.dropped if g_id == guild_id}
+
+    # Display name, or a mention when the user is not cached
+    def username(self, user_id):
+        return self.usernames.get(user_id, f"<@{user_id}>")
+
+    def rank(self, guild_id, user_id):
+        for position, (ranked_user_id, _, _) in enumerate(self.ranking(guild_id, limit=None), start=1):
+            if ranked_user_id == user_id:
+                return position
+        return None
+
+    # Rows for the given users. Users without a score get a None score, meaning their row is deleted.
+    def rows(self, keys):
+        return [(self.date, user_id, self.username(user_id), guild_id, self.score(guild_id, user_id))
+                for guild_id, user_id in keys]
+
+    # Leaderboard rows changed since the last flush, ready for a bulk upsert (or delete for None scores)
+    def take_dirty_rows(self):
+        with self.lock:
+            self.roll_over()
+            rows = self.pending + self.rows(self.dirty)
+            self.pending = []
+            self.dirty = set()
+        # One row per (date, user, guild), newest wins, so the bulk upsert never touches a row twice
+        latest = {(row[0], row[1], row[3]): row for row in rows}
+        return list(latest.values())
+
+    # Put rows back after a failed flush so they are retried next time
+    def restore_rows(self, rows):
+        with self.lock:
+            self.pending = rows + self.pending
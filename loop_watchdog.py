@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Helper: True for the bot's own top-level modules. Anything below the project directory
+# (.venv/, Heroku's .heroku/python site-packages) is library code.
+def is_project_file(filename):
+    filename = os.path.abspath(filename)
+    return os.path.dirname(filename) == PROJECT_DIR and os.path.basename(filename) != "loop_watchdog.py"
+
+
+# Helper: Innermost frame that belongs to this project, so a stall inside a library call
+# (psycopg2, requests, time.sleep...) is attributed to the bot code that made the call
+def call_site(stack):
+    for frame in reversed(stack):
+        if is_project_file(frame.filename):
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+# Measures event loop lag and catches blocking callbacks.
+# A heartbeat task ticks on the loop every `interval` seconds. A separate thread watches the
+# heartbeat, and when the loop has not ticked for `threshold` seconds it captures the loop
+# thread's stack while it is still blocked and counts the offending call site.
+class LoopWatchdog:
+    def __init__(self, interval=0.1, threshold=0.5):
+        self.interval = interval
+        self.threshold = threshold
+        self.loop_thread_id = None
+        self.last_beat = time.monotonic()
+        self.max_lag = 0.0
+        self.lag_samples = 0
+        self.total_lag = 0.0
+        self.stalls = Counter()
+        self.stall_stacks = {}
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        asyncio.get_running_loop().create_task(self.heartbeat())
+        threading.Thread(target=self.watch, name="loop-watchdog", daemon=True).start()
+        logging.info(f"Loop watchdog started (threshold {self.threshold * 1000:.0f}ms).")
+
+    def stop(self):
+        self.running = False
+
+    async def heartbeat(self):
+        while self.running:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.last_beat = time.monotonic()
+            lag = self.last_beat - start - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.lag_samples += 1
+
+    def watch(self):
+        reported_beat = None
+        while self.running:
+            time.sleep(self.interval / 2)
+            beat = self.last_beat
+            blocked_for = time.monotonic() - beat
+            if blocked_for < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            site = call_site(stack)
+            self.stalls[site] += 1
+            self.stall_stacks[site] = "".join(traceback.format_list(stack[-8:]))
+            logging.warning(f"Event loop blocked for {blocked_for * 1000:.0f}ms at {site}\n{self.stall_stacks[site]}")
+
+    def summary(self, limit=5):
+        average = self.total_lag / self.lag_samples if self.lag_samples else 0.0
+        lines = [f"Loop lag: avg {average * 1000:.1f}ms, max {self.max_lag * 1000:.1f}ms",
+                 f"Stalls over {self.threshold * 1000:.0f}ms: {sum(self.stalls.values())}"]
+        for site, count in self.stalls.most_common(limit):
+            lines.append(f"{count}x {site}")
+        return "\n".join(lines)
+
+
+# Sampling profiler for a single thread. Returns collapsed stacks ("frame;frame;frame count"),
+# the input format for flamegraph.pl and speedscope. Blocks for `duration`, so run it in a thread.
+def profile_thread(thread_id, duration, interval=0.005):
+    samples = Counter()
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stack = traceback.extract_stack(frame)
+            samples[";".join(f"{os.path.basename(entry.filename)}:{entry.name}" for entry in stack)] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in samples.most_common())
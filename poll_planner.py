@@ -0,0 +1,164 @@
+import heapq
+import logging
+import math
+import time
+
+
+# Decides how often each watched symbol is polled so monthly API usage lands just under the limit.
+# Every symbol gets a weight from its watcher count, recent volatility and how close its last move
+# came to its watchers' thresholds. The polling budget (remaining quota spread over the time left
+# until the reset) is shared out in proportion to those weights: hot symbols are polled often,
+# idle ones rarely. When the budget cannot cover every symbol even at max_interval, the coldest
+# symbols are paused until the budget recovers instead of failing every request.
+# `tolerance` lets a symbol count as due slightly early, so a poll scheduled exactly one interval
+# after the last one is not pushed back by clock rounding. With a sweep `window`, intervals are
+# planned in whole windows, since the monitor only visits each symbol once per window.
+class PollPlanner:
+    def __init__(self, min_interval=300, max_interval=4 * 3600, budget_share=0.8, tolerance=0.0, window=None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget_share = budget_share
+        self.tolerance = tolerance
+        self.window = window
+        self.intervals = {}
+        self.last_polled = {}
+        self.volatility = {}
+        self.proximity = {}
+        self.last_seen = {}
+        self.paused = set()
+
+    # Record a new price and update the symbol's volatility: an EWMA of the percent move
+    # per sqrt(hour), so moves over different polling intervals are comparable
+    def observe(self, symbol, price, proximity=None, now=None):
+        now = time.monotonic() if now is None else now
+        previous = self.last_seen.get(symbol)
+        if previous and previous[0] > 0:
+            hours = max((now - previous[1]) / 3600, 1 / 60)
+            move = abs(price / previous[0] - 1) * 100 / math.sqrt(hours)
+            self.volatility[symbol] = 0.7 * self.volatility.get(symbol, move) + 0.3 * move
+        self.last_seen[symbol] = (price, now)
+        if proximity is not None:
+            self.proximity[symbol] = proximity
+
+    # Longest interval the monitor can actually run: max_interval rounded down to whole windows
+    @property
+    def longest_interval(self):
+        if not self.window:
+            return self.max_interval
+        return max(self.max_interval // self.window, 1) * self.window
+
+    def weight(self, symbol, watchers, min_threshold):
+        heat = self.proximity.get(symbol, 0.5) + self.volatility.get(symbol, 0.0) / max(min_threshold, 0.1)
+        return math.sqrt(max(watchers, 1)) * (0.1 + heat)
+
+    # Recompute every symbol's interval.
+    #   symbols:          {symbol: (watcher_count, lowest watcher threshold)}
+    #   remaining_calls:  API calls left this month, or None if unlimited
+    #   seconds_left:     seconds until the quota resets
+    #   cost_per_symbol:  API calls one symbol poll costs (1 / batch size for batching providers)
+    def plan(self, symbols, remaining_calls, seconds_left, cost_per_symbol=1.0):
+        self.paused = set()
+        if not symbols:
+            self.intervals = {}
+            return
+        if remaining_calls is None:
+            self.intervals = self.quantize({symbol: self.min_interval for symbol in symbols}, math.inf)
+            return
+
+        # Calls per second the monitor may spend, leaving the rest for user commands
+        budget = max(remaining_calls, 0) * self.budget_share / max(seconds_left, 60)
+        weights = {symbol: self.weight(symbol, watchers, threshold) for symbol, (watchers, threshold) in symbols.items()}
+
+        # Drop the coldest symbols until the rest can be polled at least every max_interval
+        ranked = sorted(weights, key=weights.get, reverse=True)
+        longest = self.longest_interval
+        affordable = int(budget * longest / cost_per_symbol) if cost_per_symbol > 0 else len(ranked)
+        if affordable < len(ranked):
+            self.paused = set(ranked[affordable:])
+            ranked = ranked[:affordable]
+            logging.warning(f"API budget only covers {affordable}/{len(symbols)} symbols. "
+                            f"Pausing the {len(self.paused)} least active until the budget recovers.")
+
+        # Share the polls per second out by weight. Symbols clamped to min/max_interval are fixed
+        # and the budget they free up or use is redistributed over the rest.
+        polls_per_second = total_polls = budget / cost_per_symbol if cost_per_symbol > 0 else math.inf
+        intervals = {}
+        free = list(ranked)
+        while free:
+            total_weight = sum(weights[symbol] for symbol in free) or 1.0
+            clamped = False
+            for symbol in free:
+                rate = polls_per_second * weights[symbol] / total_weight
+                interval = 1 / rate if rate > 0 else math.inf
+                if interval <= self.min_interval or interval >= longest:
+                    intervals[symbol] = min(max(interval, self.min_interval), longest)
+                    polls_per_second = max(polls_per_second - 1 / intervals[symbol], 0)
+                    clamped = True
+            if not clamped:
+                for symbol in free:
+                    intervals[symbol] = total_weight / (polls_per_second * weights[symbol])
+                break
+            free = [symbol for symbol in free if symbol not in intervals]
+        self.intervals = self.quantize(intervals, total_polls)
+
+    # Turn planned intervals into whole sweep windows. Every interval is rounded up, which can only
+    # underspend, then the most under-served symbols are shortened one window at a time while the
+    # polls per second they add still fit in the budget.
+    def quantize(self, intervals, polls_per_second):
+        if not self.window:
+            return intervals
+        window = self.window
+        fewest = max(math.ceil(self.min_interval / window - 1e-9), 1)
+        most = max(self.longest_interval // window, fewest)
+        windows = {symbol: min(max(math.ceil(interval / window - 1e-9), fewest), most)
+                   for symbol, interval in intervals.items()}
+        spare = polls_per_second - sum(1 / (count * window) for count in windows.values())
+        # Largest ratio of rounded to planned interval first
+        heap = [(-count * window / intervals[symbol], symbol) for symbol, count in windows.items() if count > fewest]
+        heapq.heapify(heap)
+        while heap and spare > 0:
+            _, symbol = heapq.heappop(heap)
+            count = windows[symbol]
+            extra = 1 / ((count - 1) * window) - 1 / (count * window)
+            if extra > spare:
+                continue
+            windows[symbol] = count - 1
+            spare -= extra
+            if count - 1 > fewest:
+                heapq.heappush(heap, (-(count - 1) * window / intervals[symbol], symbol))
+        return {symbol: count * window for symbol, count in windows.items()}
+
+    # True when a scheduled symbol's interval has elapsed. Paused symbols are never due.
+    def is_due(self, symbol, now=None):
+        interval = self.intervals.get(symbol)
+        if interval is None:
+            return False
+        last = self.last_polled.get(symbol)
+        now = time.monotonic() if now is None else now
+        return last is None or now - last + self.tolerance >= interval
+
+    def mark_polled(self, symbols, now=None):
+        now = time.monotonic() if now is None else now
+        for symbol in symbols:
+            self.last_polled[symbol] = now
+
+    # Restore poll times saved as wall-clock timestamps before a restart
+    def restore_last_polled(self, wall_times):
+        now, wall_now = time.monotonic(), time.time()
+        for symbol, polled_at in wall_times.items():
+            self.last_polled[symbol] = now - (wall_now - polled_at)
+
+    # Forget symbols nobody watches any more
+    def prune(self, symbols):
+        for table in (self.last_polled, self.volatility, self.proximity, self.last_seen):
+            for symbol in list(table):
+                if symbol not in symbols:
+                    del table[symbol]
+
+    def summary(self):
+        if not self.intervals:
+            return "No symbols scheduled."
+        intervals = sorted(self.intervals.values())
+        median = intervals[len(intervals) // 2]
+        return (f"{len(intervals)} symbols scheduled, polling every {intervals[0] / 60:.0f}-{intervals[-1] / 60:.0f} min "
+                f"(median {median / 60:.0f} min), {len(self.paused)} paused")
@@ -0,0 +1,429 @@
+import asyncio
+import logging
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import aiohttp
+
+# A single quote as returned by any provider
+Quote = namedtuple("Quote", ["symbol", "price", "prev_close", "timestamp"])
+
+
+class ProviderError(Exception):
+    pass
+
+
+# Helper: Split a list of symbols into provider-sized batches
+def chunked(symbols, size):
+    for i in range(0, len(symbols), size):
+        yield symbols[i:i + size]
+
+
+# Helper: First moment of the month after `now`, when monthly quotas reset
+def next_month_start(now):
+    return datetime(now.year + now.month // 12, now.month % 12 + 1, 1)
+
+
+# Base class for quote providers.
+# fetch_quotes() makes exactly one API call for up to batch_size symbols and returns
+# {symbol: Quote or None}, where None means the provider answered but the symbol is invalid.
+class QuoteProvider:
+    name = "base"
+    batch_size = 1
+
+    def __init__(self, monthly_limit=None):
+        self.monthly_limit = monthly_limit
+        self.request_count = 0
+        self.reset_date = next_month_start(datetime.now())
+
+    # Start a new month's count once the reset date has passed
+    def check_reset(self, now=None):
+        now = datetime.now() if now is None else now
+        if now >= self.reset_date:
+            logging.info(f"{self.name} monthly quota reset ({self.request_count} requests used)")
+            self.request_count = 0
+            self.reset_date = next_month_start(now)
+
+    def has_quota(self):
+        self.check_reset()
+        return self.monthly_limit is None or self.request_count < self.monthly_limit
+
+    async def fetch_quotes(self, session, symbols):
+        raise NotImplementedError
+
+    # Return every tradable symbol the provider knows about, or None if unsupported
+    async def fetch_symbols(self, session):
+        return None
+
+    # Daily candles between two unix timestamps as ([day timestamps], [closes]), oldest first.
+    # Returns None if unsupported.
+    async def fetch_candles(self, session, symbol, start, end):
+        return None
+
+
+class FinnhubProvider(QuoteProvider):
+    name = "finnhub"
+    batch_size = 1
+    QUOTE_URL = "https://finnhub.io/api/v1/quote"
+    SYMBOL_URL = "https://finnhub.io/api/v1/stock/symbol"
+    CANDLE_URL = "https://finnhub.io/api/v1/stock/candle"
+
+    def __init__(self, api_key, monthly_limit=None):
+        super().__init__(monthly_limit)
+        self.api_key = api_key
+
+    async def fetch_quotes(self, session, symbols):
+        symbol = symbols[0]
+        params = {"symbol": symbol, "token": self.api_key}
+        async with session.get(self.QUOTE_URL, params=params) as response:
+            if response.status == 429:
+                raise ProviderError("Finnhub rate limit exceeded")
+            response.raise_for_status()
+            data = await response.json()
+
+        logging.info(f"API response for {symbol}: {data}")
+
+        # "c" is the current price, 0 means the symbol is unknown
+        if data.get("c", 0) > 0:
+            return {symbol: Quote(symbol, data["c"], data.get("pc"), data.get("t") or time.time())}
+        logging.warning(f"Invalid stock symbol: {symbol}. API returned: {data}")
+        return {symbol: None}
+
+    async def fetch_symbols(self, session):
+        params = {"exchange": "US", "token": self.api_key}
+        async with session.get(self.SYMBOL_URL, params=params) as response:
+            response.raise_for_status()
+            data = await response.json()
+        if not isinstance(data, list):
+            raise ProviderError(f"Unexpected Finnhub symbol response: {data}")
+        return [item["symbol"] for item in data if isinstance(item, dict) and item.get("symbol")]
+
+    async def fetch_candles(self, session, symbol, start, end):
+        params = {"symbol": symbol, "resolution": "D", "from": int(start), "to": int(end), "token": self.api_key}
+        async with session.get(self.CANDLE_URL, params=params) as response:
+            if response.status == 429:
+                raise ProviderError("Finnhub rate limit exceeded")
+            response.raise_for_status()
+            data = await response.json()
+        if data.get("s") == "no_data":
+            return [], []
+        if data.get("s") != "ok":
+            raise ProviderError(f"Unexpected Finnhub candle response for {symbol}: {data}")
+        return data["t"], data["c"]
+
+
+# Financial Modeling Prep supports comma separated multi-symbol quotes in a single call
+class FMPProvider(QuoteProvider):
+    name = "fmp"
+    batch_size = 100
+    QUOTE_URL = "https://financialmodelingprep.com/api/v3/quote/{symbols}"
+    SYMBOL_URL = "https://financialmodelingprep.com/api/v3/stock/list"
+    CANDLE_URL = "https://financialmodelingprep.com/api/v3/historical-price-full/{symbol}"
+
+    def __init__(self, api_key, monthly_limit=None):
+        super().__init__(monthly_limit)
+        self.api_key = api_key
+
+    async def fetch_quotes(self, session, symbols):
+        url = self.QUOTE_URL.format(symbols=",".join(symbols))
+        async with session.get(url, params={"apikey": self.api_key}) as response:
+            if response.status == 429:
+                raise ProviderError("FMP rate limit exceeded")
+            response.raise_for_status()
+            data = await response.json()
+
+        if not isinstance(data, list):
+            raise ProviderError(f"Unexpected FMP response: {data}")
+
+        logging.info(f"FMP batch response for {len(symbols)} symbols: {len(data)} quotes")
+        quotes = {symbol: None for symbol in symbols}
+        for item in data:
+            symbol = item.get("symbol")
+            price = item.get("price") or 0
+            if symbol in quotes and price > 0:
+                quotes[symbol] = Quote(symbol, price, item.get("previousClose"), item.get("timestamp") or time.time())
+        return quotes
+
+    async def fetch_symbols(self, session):
+        async with session.get(self.SYMBOL_URL, params={"apikey": self.api_key}) as response:
+            response.raise_for_status()
+            data = await response.json()
+        if not isinstance(data, list):
+            raise ProviderError(f"Unexpected FMP response: {data}")
+        return [item["symbol"] for item in data if isinstance(item, dict) and item.get("symbol")]
+
+    async def fetch_candles(self, session, symbol, start, end):
+        params = {
+            "from": datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%d"),
+            "to": datetime.fromtimestamp(end, timezone.utc).strftime("%Y-%m-%d"),
+            "serietype": "line",
+            "apikey": self.api_key,
+        }
+        async with session.get(self.CANDLE_URL.format(symbol=symbol), params=params) as response:
+            if response.status == 429:
+                raise ProviderError("FMP rate limit exceeded")
+            response.raise_for_status()
+            data = await response.json()
+        # FMP lists the newest day first
+        history = list(reversed(data.get("historical", []))) if isinstance(data, dict) else []
+        timestamps = [datetime.strptime(item["date"], "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() for item in history]
+        return timestamps, [item["close"] for item in history]
+
+
+# Local provider for tests and offline development. Prices follow a seeded random walk.
+# When a price table is given only those symbols are valid, and `failing` simulates an outage.
+class FakeProvider(QuoteProvider):
+    name = "fake"
+    batch_size = 500
+
+    def __init__(self, prices=None, monthly_limit=None, seed=0, failing=False):
+        super().__init__(monthly_limit)
+        self.prices = dict(prices or {})
+        self.known_only = prices is not None
+        self.random = random.Random(seed)
+        self.failing = failing
+        self.calls = []
+
+    async def fetch_quotes(self, session, symbols):
+        self.calls.append(list(symbols))
+        if self.failing:
+            raise ProviderError("Fake provider outage")
+
+        quotes = {}
+        for symbol in symbols:
+            if symbol not in self.prices:
+                if self.known_only:
+                    quotes[symbol] = None
+                    continue
+                self.prices[symbol] = round(self.random.uniform(10, 500), 2)
+            prev_close = self.prices[symbol]
+            self.prices[symbol] = round(prev_close * (1 + self.random.gauss(0, 0.01)), 2)
+            quotes[symbol] = Quote(symbol, self.prices[symbol], prev_close, time.time())
+        return quotes
+
+    async def fetch_symbols(self, session):
+        if self.failing:
+            raise ProviderError("Fake provider outage")
+        return list(self.prices) if self.known_only else None
+
+    # Deterministic daily random walk per symbol
+    async def fetch_candles(self, session, symbol, start, end):
+        if self.failing:
+            raise ProviderError("Fake provider outage")
+        if self.known_only and symbol not in self.prices:
+            return [], []
+        walk = random.Random(symbol)
+        day = 86400
+        timestamps = list(range(int(start) // day * day, int(end), day))
+        price = walk.uniform(10, 500)
+        closes = []
+        for _ in timestamps:
+            price *= 1 + walk.gauss(0, 0.02)
+            closes.append(round(price, 2))
+        return timestamps, closes
+
+
+# Health tracking and circuit breaker for a single provider.
+# After `failure_threshold` consecutive failures the circuit opens for `reset_timeout`
+# seconds, then a single trial call is allowed (half-open) before closing again.
+class ProviderHealth:
+    def __init__(self, failure_threshold=3, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.latency = None
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def available(self):
+        return self.state != "open"
+
+    def record_success(self, latency):
+        self.consecutive_failures = 0
+        self.total_successes += 1
+        self.opened_at = None
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        if self.state == "half-open" or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+# Routes quote requests across providers in priority order, batching symbols per provider
+# and failing over to the next provider when one is unhealthy or out of quota.
+# Multi-symbol requests try batching providers first, so a sweep costs a few calls, not one per symbol.
+# on_request(provider_name) is called once per API call so usage can be persisted.
+class ProviderRouter:
+    def __init__(self, providers, on_request=None, timeout=10):
+        self.providers = list(providers)
+        self.health = {provider.name: ProviderHealth() for provider in self.providers}
+        # Candles have their own circuits so a failing history endpoint never blocks live quotes
+        self.candle_health = {provider.name: ProviderHealth() for provider in self.providers}
+        self.candles_unsupported = {provider.name for provider in self.providers
+                                    if type(provider).fetch_candles is QuoteProvider.fetch_candles}
+        self.on_request = on_request
+        self.timeout = timeout
+        self.session = None
+
+    def get_provider(self, name):
+        for provider in self.providers:
+            if provider.name == name:
+                return provider
+        return None
+
+    async def get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    # Providers in the order to try for a request of `count` symbols
+    def provider_order(self, count):
+        if count <= 1:
+            return self.providers
+        return sorted(self.providers, key=lambda provider: provider.batch_size == 1)
+
+    async def record_request(self, provider):
+        provider.request_count += 1
+        if self.on_request:
+            try:
+                await asyncio.to_thread(self.on_request, provider.name)
+            except Exception:
+                logging.exception(f"Failed to record API usage for {provider.name}")
+
+    # Fetch quotes for many symbols. Returns {symbol: Quote} for valid symbols only.
+    async def fetch_quotes(self, symbols, retries=3, delay=2):
+        pending = list(dict.fromkeys(symbols))
+        quotes = {}
+        session = await self.get_session()
+
+        for attempt in range(retries):
+            for provider in self.provider_order(len(pending)):
+                if not pending:
+                    return quotes
+                health = self.health[provider.name]
+                if not health.available():
+                    logging.debug(f"Skipping {provider.name}: circuit open")
+                    continue
+
+                unresolved = []
+                for batch in chunked(pending, provider.batch_size):
+                    if not health.available() or not provider.has_quota():
+                        unresolved.extend(batch)
+                        continue
+                    start = time.monotonic()
+                    try:
+                        await self.record_request(provider)
+                        result = await provider.fetch_quotes(session, batch)
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ProviderError) as e:
+                        health.record_failure()
+                        logging.warning(f"{provider.name} failed for {len(batch)} symbols "
+                                        f"(attempt {attempt + 1}/{retries}, circuit {health.state}): {e}")
+                        unresolved.extend(batch)
+                        continue
+                    except Exception as e:
+                        health.record_failure()
+                        logging.exception(f"Unexpected error from {provider.name}: {e}")
+                        unresolved.extend(batch)
+                        continue
+                    health.record_success(time.monotonic() - start)
+                    for symbol in batch:
+                        quote = result.get(symbol)
+                        if quote is not None:
+                            quotes[symbol] = quote
+                if not provider.has_quota():
+                    logging.warning(f"{provider.name} has reached its monthly limit of {provider.monthly_limit}")
+                pending = unresolved
+
+            if not pending:
+                break
+            if attempt < retries - 1:
+                await asyncio.sleep(delay)
+
+        if pending:
+            logging.warning(f"No provider could quote {len(pending)} symbols: {', '.join(pending[:10])}")
+        return quotes
+
+    # Fetch the symbol universe from the first healthy provider that supports it
+    async def fetch_symbols(self):
+        session = await self.get_session()
+        for provider in self.providers:
+            health = self.health[provider.name]
+            if not health.available() or not provider.has_quota():
+                continue
+            start = time.monotonic()
+            try:
+                await self.record_request(provider)
+                symbols = await provider.fetch_symbols(session)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ProviderError) as e:
+                health.record_failure()
+                logging.warning(f"{provider.name} failed to list symbols: {e}")
+                continue
+            health.record_success(time.monotonic() - start)
+            if symbols:
+                logging.info(f"Fetched {len(symbols)} symbols from {provider.name}")
+                return symbols
+        return None
+
+    # Fetch daily candles for one symbol from the first healthy provider that supports them.
+    # A provider that rejects the key for candles (401/403) is not asked again.
+    async def fetch_candles(self, symbol, start, end):
+        session = await self.get_session()
+        for provider in self.providers:
+            health = self.candle_health[provider.name]
+            if provider.name in self.candles_unsupported or not health.available() or not provider.has_quota():
+                continue
+            begin = time.monotonic()
+            try:
+                await self.record_request(provider)
+                candles = await provider.fetch_candles(session, symbol, start, end)
+            except aiohttp.ClientResponseError as e:
+                if e.status in (401, 403):
+                    logging.warning(f"{provider.name} does not allow candles with this API key ({e.status}). Not asking again.")
+                    self.candles_unsupported.add(provider.name)
+                    continue
+                health.record_failure()
+                logging.warning(f"{provider.name} failed to fetch candles for {symbol}: {e}")
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError, ProviderError) as e:
+                health.record_failure()
+                logging.warning(f"{provider.name} failed to fetch candles for {symbol}: {e}")
+                continue
+            health.record_success(time.monotonic() - begin)
+            if candles is None:
+                self.candles_unsupported.add(provider.name)
+                continue
+            return candles
+        return None
+
+    # API calls one symbol quote costs on the provider that would currently serve a sweep
+    def cost_per_symbol(self):
+        for provider in self.provider_order(2):
+            if self.health[provider.name].available() and provider.has_quota():
+                return 1 / provider.batch_size
+        return 1.0
+
+    def status(self):
+        lines = []
+        for provider in self.providers:
+            health = self.health[provider.name]
+            limit = provider.monthly_limit if provider.monthly_limit is not None else "unlimited"
+            latency = f"{health.latency * 1000:.0f}ms" if health.latency is not None else "n/a"
+            lines.append(f"{provider.name}: {provider.request_count}/{limit} requests, circuit {health.state}, latency {latency}")
+        return lines
@@ -0,0 +1,97 @@
+import logging
+import sqlite3
+from contextlib import closing
+import threading
+import time
+from datetime import datetime
+
+from providers import Quote
+
+
+# In-memory quote cache keyed by symbol. Entries remember when they were fetched (wall clock,
+# so the age is still correct after a restart) and are snapshotted to a local SQLite file.
+class QuoteCache:
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, symbol, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        entry = self.entries.get(symbol)
+        if entry is None:
+            return None
+        quote, fetched_at = entry
+        if time.time() - fetched_at > max_age:
+            return None
+        return quote
+
+    # Split symbols into cached quotes and symbols that still need fetching
+    def get_many(self, symbols, max_age=None):
+        cached = {}
+        missing = []
+        for symbol in symbols:
+            quote = self.get(symbol, max_age)
+            if quote is None:
+                missing.append(symbol)
+            else:
+                cached[symbol] = quote
+        return cached, missing
+
+    # Latest cached quote regardless of age, with the time it was fetched
+    def peek(self, symbol):
+        return self.entries.get(symbol)
+
+    # Today's percent change per symbol from quotes fetched today
+    def day_changes(self):
+        today = datetime.now().date()
+        changes = {}
+        for symbol, (quote, fetched_at) in list(self.entries.items()):
+            if quote.prev_close and datetime.fromtimestamp(fetched_at).date() == today:
+                changes[symbol] = (quote.price - quote.prev_close) / quote.prev_close * 100
+        return changes
+
+    def put_many(self, quotes, fetched_at=None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self.lock:
+            for symbol, quote in quotes.items():
+                self.entries[symbol] = (quote, fetched_at)
+
+    def snapshot(self):
+        with self.lock:
+            rows = [(symbol, quote.price, quote.prev_close, quote.timestamp, fetched_at)
+                    for symbol, (quote, fetched_at) in self.entries.items()]
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS quote_cache (
+                    symbol TEXT PRIMARY KEY,
+                    price REAL,
+                    prev_close REAL,
+                    quote_ts REAL,
+                    fetched_at REAL
+                )
+            """)
+            conn.executemany("INSERT OR REPLACE INTO quote_cache VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute("DELETE FROM quote_cache WHERE fetched_at < ?", (time.time() - 86400,))
+        logging.debug(f"Snapshotted {len(rows)} quotes to {self.path}")
+        return len(rows)
+
+    # Reload a snapshot, keeping the original fetch times. Entries older than max_age are dropped.
+    def load(self, max_age=86400):
+        try:
+            with closing(sqlite3.connect(self.path)) as conn:
+                rows = conn.execute(
+                    "SELECT symbol, price, prev_close, quote_ts, fetched_at FROM quote_cache WHERE fetched_at >= ?",
+                    (time.time() - max_age,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logging.info(f"No quote cache snapshot loaded from {self.path}: {e}")
+            return 0
+        with self.lock:
+            for symbol, price, prev_close, quote_ts, fetched_at in rows:
+                current = self.entries.get(symbol)
+                if current is None or current[1] < fetched_at:
+                    self.entries[symbol] = (Quote(symbol, price, prev_close, quote_ts), fetched_at)
+        logging.info(f"Loaded {len(rows)} cached quotes from {self.path}")
+        return len(rows)
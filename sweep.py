@@ -0,0 +1,99 @@
+import asyncio
+import bisect
+import logging
+import math
+import sqlite3
+import time
+from contextlib import closing
+
+
+# Paces the monitor sweep evenly over a fixed-cadence window.
+# The window is cut into slices that fire on a monotonic schedule (start + k * slice_seconds),
+# so the period never drifts by however long a slice took, and each slice takes the next share
+# of the sorted symbol list after the cursor. The cursor and each symbol's last poll time are
+# saved to a local SQLite file so a restart resumes where the sweep stopped.
+class SweepScheduler:
+    def __init__(self, path, window=300, slice_seconds=10):
+        self.path = path
+        self.window = window
+        self.slice_seconds = slice_seconds
+        self.cursor = None
+        self.start = None
+        self.slice_start = None
+        self.tick = 0
+        self.current_window = None
+
+    @property
+    def slices_per_window(self):
+        return max(int(self.window / self.slice_seconds), 1)
+
+    @property
+    def window_index(self):
+        return (self.tick - 1) // self.slices_per_window
+
+    # True on the first slice run in each window. Skipped slices can jump over a window's first
+    # slice, so this compares window indexes rather than checking for slice 1.
+    def starts_window(self):
+        if self.window_index == self.current_window:
+            return False
+        self.current_window = self.window_index
+        return True
+
+    # Sleep until the next slice boundary. Slices missed while the loop was busy are skipped
+    # rather than run back to back, so a slow slice never causes a burst.
+    # slice_start holds the scheduled (monotonic) start of the current slice; polls are stamped with
+    # it so a symbol visited exactly one window later is due again regardless of fetch latency.
+    async def wait_for_slice(self):
+        now = time.monotonic()
+        if self.start is None:
+            self.start = self.slice_start = now
+            self.tick = 1
+            return
+        self.tick += 1
+        target = self.start + (self.tick - 1) * self.slice_seconds
+        if target < now:
+            missed = math.ceil((now - target) / self.slice_seconds)
+            logging.warning(f"Monitor sweep is {now - target:.1f}s behind schedule. Skipping {missed} slices.")
+            self.tick += missed
+            target = self.start + (self.tick - 1) * self.slice_seconds
+        self.slice_start = target
+        await asyncio.sleep(target - now)
+
+    # Next share of the sorted symbols after the cursor, wrapping around at the end.
+    # A slice is never smaller than min_size, so batching providers still get full batches.
+    def next_slice(self, symbols, min_size=1):
+        if not symbols:
+            return []
+        size = min(max(math.ceil(len(symbols) / self.slices_per_window), min_size), len(symbols))
+        start = bisect.bisect_right(symbols, self.cursor) if self.cursor is not None else 0
+        chunk = [symbols[(start + i) % len(symbols)] for i in range(size)]
+        self.cursor = chunk[-1]
+        return chunk
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE IF NOT EXISTS sweep_state (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS poll_times (symbol TEXT PRIMARY KEY, polled_at REAL)")
+        return conn
+
+    # Persist the cursor and the wall-clock poll time of the symbols checked in this slice
+    def save(self, polled_symbols, polled_at=None):
+        polled_at = time.time() if polled_at is None else polled_at
+        with closing(self.connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO sweep_state VALUES ('cursor', ?)", (self.cursor,))
+            conn.executemany("INSERT OR REPLACE INTO poll_times VALUES (?, ?)",
+                             [(symbol, polled_at) for symbol in polled_symbols])
+
+    # Restore the cursor and return {symbol: wall-clock time it was last polled}
+    def load(self):
+        try:
+            with closing(self.connect()) as conn, conn:
+                row = conn.execute("SELECT value FROM sweep_state WHERE key = 'cursor'").fetchone()
+                self.cursor = row[0] if row else None
+                conn.execute("DELETE FROM poll_times WHERE polled_at < ?", (time.time() - 86400,))
+                poll_times = dict(conn.execute("SELECT symbol, polled_at FROM poll_times").fetchall())
+        except sqlite3.Error:
+            logging.exception(f"Failed to load sweep state from {self.path}")
+            return {}
+        logging.info(f"Resuming monitor sweep after {self.cursor} with {len(poll_times)} recent polls.")
+        return poll_times
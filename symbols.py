@@ -0,0 +1,75 @@
+import bisect
+import difflib
+import logging
+import os
+import time
+
+
+# Local index of every valid ticker symbol so typos can be rejected without an API call.
+# The index is stored on disk as a sorted, newline separated ASCII file and kept in memory
+# as a sorted list for binary search.
+class SymbolIndex:
+    def __init__(self, path):
+        self.path = path
+        self.symbols = []
+        self.by_length = {}
+        self.updated_at = 0
+
+    @property
+    def ready(self):
+        return bool(self.symbols)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            logging.info(f"Symbol index {self.path} not found. Symbols will be validated online until it is built.")
+            return False
+        try:
+            with open(self.path, "r", encoding="ascii") as f:
+                symbols = f.read().split()
+        except (OSError, UnicodeDecodeError):
+            logging.exception(f"Failed to load symbol index {self.path}")
+            return False
+        self.set_symbols(symbols)
+        self.updated_at = os.path.getmtime(self.path)
+        logging.info(f"Loaded {len(self.symbols)} symbols from {self.path}")
+        return True
+
+    def save(self, symbols):
+        self.set_symbols(symbols)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="ascii") as f:
+            f.write("\n".join(self.symbols))
+        os.replace(tmp_path, self.path)
+        self.updated_at = time.time()
+        logging.info(f"Saved {len(self.symbols)} symbols to {self.path}")
+
+    def set_symbols(self, symbols):
+        cleaned = {symbol.strip().upper() for symbol in symbols if symbol and symbol.strip().isascii()}
+        self.symbols = sorted(cleaned)
+        self.by_length = {}
+        for symbol in self.symbols:
+            self.by_length.setdefault(len(symbol), []).append(symbol)
+
+    def is_stale(self, max_age=86400):
+        return time.time() - self.updated_at >= max_age
+
+    def __contains__(self, symbol):
+        i = bisect.bisect_left(self.symbols, symbol)
+        return i < len(self.symbols) and self.symbols[i] == symbol
+
+    def __len__(self):
+        return len(self.symbols)
+
+    # Near matches for an unknown symbol: close spellings first, then symbols sharing its prefix
+    def suggest(self, symbol, limit=3):
+        candidates = []
+        for length in (len(symbol) - 1, len(symbol), len(symbol) + 1):
+            candidates.extend(self.by_length.get(length, []))
+        suggestions = difflib.get_close_matches(symbol, candidates, n=limit, cutoff=0.6)
+
+        i = bisect.bisect_left(self.symbols, symbol)
+        while len(suggestions) < limit and i < len(self.symbols) and self.symbols[i].startswith(symbol):
+            if self.symbols[i] not in suggestions:
+                suggestions.append(self.symbols[i])
+            i += 1
+        return suggestions
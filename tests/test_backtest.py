@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+
+from backtest import DAY, CandleCache, simulate_alerts
+from providers import FakeProvider, ProviderRouter
+
+
+def test_simulate_counts_moves_per_threshold():
+    closes = [[100, 103, 100, 110], [50, 50, 51]]
+    totals, per_symbol = simulate_alerts(closes, [1, 5])
+    assert per_symbol.tolist() == [[3, 1], [1, 0]]
+    assert totals.tolist() == [4, 1]
+
+
+def test_simulate_handles_empty_and_short_histories():
+    totals, per_symbol = simulate_alerts([[], [100]], [1, 2])
+    assert totals.tolist() == [0, 0]
+    assert per_symbol.shape == (2, 2)
+
+
+class DeniedCandles(FakeProvider):
+    name = "denied"
+
+    async def fetch_candles(self, session, symbol, start, end):
+        self.calls.append(symbol)
+        raise aiohttp.ClientResponseError(None, (), status=403)
+
+
+def test_unauthorized_candle_provider_is_not_asked_again():
+    denied, backup = DeniedCandles(), FakeProvider()
+    router = ProviderRouter([denied, backup])
+
+    async def fetch_many():
+        try:
+            return [await router.fetch_candles(f"S{i}", 0, 10 * DAY) for i in range(5)]
+        finally:
+            await router.close()
+
+    results = asyncio.run(fetch_many())
+    assert all(len(closes) == 10 for _, closes in results)
+    assert denied.calls == ["S0"]
+    assert router.health["denied"].state == "closed"
+    assert router.candle_health["denied"].consecutive_failures == 0
+
+
+def test_cached_candles_are_fetched_once(tmp_path):
+    provider = FakeProvider()
+    router = ProviderRouter([provider])
+    cache = CandleCache(str(tmp_path))
+
+    async def fetch_twice():
+        try:
+            first = await cache.fetch("AAPL", 180, router.fetch_candles)
+            second = await cache.fetch("AAPL", 90, router.fetch_candles)
+            return first, second
+        finally:
+            await router.close()
+
+    first, second = asyncio.run(fetch_twice())
+    assert provider.request_count == 1
+    assert len(first[1]) > len(second[1]) > 0
+
+
+def test_short_history_is_served_from_cache(tmp_path):
+    calls = []
+
+    async def recent_listing(symbol, start, end):
+        calls.append(symbol)
+        today = int(end // DAY * DAY)
+        timestamps = list(range(today - 30 * DAY, today, DAY))
+        return timestamps, [10.0] * len(timestamps)
+
+    cache = CandleCache(str(tmp_path))
+    for _ in range(3):
+        days, closes = asyncio.run(cache.fetch("NEW", 365, recent_listing))
+    assert calls == ["NEW"]
+    assert len(closes) == 30 and np.all(days >= int(time.time() // DAY) - 365)
@@ -0,0 +1,30 @@
+from leaderboard import LiveLeaderboard
+
+
+def test_ranking_is_best_first_per_guild():
+    leaderboard = LiveLeaderboard()
+    leaderboard.set_totals(1, 10, 6.0, 2, username="ann")
+    leaderboard.set_totals(1, 11, 5.0, 1)
+    leaderboard.set_totals(2, 12, 9.0, 1, username="cy")
+    assert leaderboard.ranking(1) == [(11, "<@11>", 5.0), (10, "ann", 3.0)]
+    assert leaderboard.rank(1, 10) == 2
+
+
+def test_emptied_watchlist_is_dropped_and_flushed_as_a_delete():
+    leaderboard = LiveLeaderboard()
+    leaderboard.set_totals(1, 10, 6.0, 2, username="ann")
+    leaderboard.take_dirty_rows()
+    leaderboard.set_totals(1, 10, 0.0, 0)
+    assert leaderboard.ranking(1) == []
+    assert leaderboard.dropped_users(1) == {10}
+    assert [row[4] for row in leaderboard.take_dirty_rows()] == [None]
+    leaderboard.set_totals(1, 10, 2.0, 1)
+    assert leaderboard.dropped_users(1) == set()
+
+
+def test_failed_flush_rows_are_retried():
+    leaderboard = LiveLeaderboard()
+    leaderboard.set_totals(1, 10, 6.0, 2)
+    rows = leaderboard.take_dirty_rows()
+    leaderboard.restore_rows(rows)
+    assert leaderboard.take_dirty_rows() == rows
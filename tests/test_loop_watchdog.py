@@ -0,0 +1,31 @@
+import os
+import traceback
+
+from loop_watchdog import PROJECT_DIR, call_site
+
+
+def frame(path, lineno, name):
+    return traceback.FrameSummary(path, lineno, name)
+
+
+def test_call_site_skips_library_frames_inside_the_checkout():
+    stack = [
+        frame(os.path.join(PROJECT_DIR, "bot.py"), 10, "on_message"),
+        frame(os.path.join(PROJECT_DIR, "bot.py"), 42, "load_stocks"),
+        frame(os.path.join(PROJECT_DIR, ".heroku", "python", "lib", "python3.12", "site-packages", "psycopg2", "__init__.py"), 122, "connect"),
+        frame(os.path.join(PROJECT_DIR, ".venv", "lib", "python3.12", "site-packages", "requests", "api.py"), 59, "request"),
+    ]
+    assert call_site(stack) == "bot.py:42 in load_stocks"
+
+
+def test_call_site_skips_the_watchdog_itself():
+    stack = [
+        frame(os.path.join(PROJECT_DIR, "bot.py"), 7, "main"),
+        frame(os.path.join(PROJECT_DIR, "loop_watchdog.py"), 80, "heartbeat"),
+    ]
+    assert call_site(stack) == "bot.py:7 in main"
+
+
+def test_call_site_falls_back_to_innermost_frame():
+    stack = [frame("/usr/lib/python3.12/asyncio/events.py", 84, "_run"), frame("/usr/lib/python3.12/time.py", 1, "sleep")]
+    assert call_site(stack) == "/usr/lib/python3.12/time.py:1 in sleep"
@@ -0,0 +1,64 @@
+from poll_planner import PollPlanner
+
+
+def test_unlimited_quota_polls_everything_at_min_interval():
+    planner = PollPlanner(min_interval=300)
+    planner.plan({"AAPL": (1, 5), "MSFT": (1, 5)}, None, 86400)
+    assert planner.intervals == {"AAPL": 300, "MSFT": 300}
+
+
+def test_plan_spends_close_to_the_budget():
+    planner = PollPlanner(min_interval=300, max_interval=4 * 3600, budget_share=0.8)
+    symbols = {f"S{i}": (1 + i % 3, 5) for i in range(50)}
+    remaining_calls, seconds_left = 10000, 10 * 86400
+    planner.plan(symbols, remaining_calls, seconds_left)
+    spend = sum(seconds_left / interval for interval in planner.intervals.values())
+    assert not planner.paused
+    assert 0.95 * remaining_calls * 0.8 <= spend <= remaining_calls * 0.8 * 1.001
+    assert all(300 <= interval <= 4 * 3600 for interval in planner.intervals.values())
+
+
+def test_hot_symbols_are_polled_more_often():
+    planner = PollPlanner()
+    planner.observe("HOT", 100.0, proximity=0.9, now=0)
+    planner.observe("HOT", 104.0, now=3600)
+    planner.observe("COLD", 100.0, proximity=0.0, now=0)
+    planner.observe("COLD", 100.0, now=3600)
+    planner.plan({"HOT": (1, 5), "COLD": (1, 5)}, 500, 30 * 86400)
+    assert planner.intervals["HOT"] < planner.intervals["COLD"]
+
+
+def test_coldest_symbols_are_paused_when_budget_is_short():
+    planner = PollPlanner(max_interval=3600)
+    symbols = {f"S{i}": (1, 5) for i in range(10)}
+    symbols["BUSY"] = (20, 5)
+    planner.plan(symbols, 5 * 86400 / 3600 / 0.8, 86400)
+    assert len(planner.paused) == 6
+    assert "BUSY" not in planner.paused
+    assert all(not planner.is_due(symbol) for symbol in planner.paused)
+
+
+def test_due_only_after_interval_elapses():
+    planner = PollPlanner(min_interval=300)
+    planner.plan({"AAPL": (1, 5)}, None, 86400)
+    assert planner.is_due("AAPL", now=1000)
+    planner.mark_polled(["AAPL"], now=1000)
+    assert not planner.is_due("AAPL", now=1200)
+    assert planner.is_due("AAPL", now=1300)
+
+
+def test_windowed_plan_uses_whole_windows_and_keeps_the_budget():
+    planner = PollPlanner(min_interval=300, max_interval=4 * 3600, budget_share=0.8, window=300)
+    symbols = {f"S{i}": (1 + i % 7, 5) for i in range(200)}
+    remaining_calls, seconds_left = 100000, 20 * 86400
+    planner.plan(symbols, remaining_calls, seconds_left)
+    budget = remaining_calls * 0.8
+    spend = sum(seconds_left / interval for interval in planner.intervals.values())
+    assert all(interval % 300 == 0 and 300 <= interval <= 4 * 3600 for interval in planner.intervals.values())
+    assert 0.95 * budget <= spend <= budget * 1.001
+
+
+def test_windowed_max_interval_rounds_down_to_whole_windows():
+    planner = PollPlanner(min_interval=300, max_interval=1000, window=300)
+    planner.plan({"AAPL": (1, 5)}, 3700, 30 * 86400)
+    assert planner.intervals == {"AAPL": 900}
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime
+
+from providers import FakeProvider, ProviderRouter, next_month_start
+
+
+class SingleSymbolProvider(FakeProvider):
+    name = "single"
+    batch_size = 1
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def fetch_quotes(router, symbols, **kwargs):
+    try:
+        return await router.fetch_quotes(symbols, delay=0, **kwargs)
+    finally:
+        await router.close()
+
+
+def test_fails_over_to_next_provider():
+    primary = FakeProvider(failing=True)
+    primary.name = "primary"
+    backup = FakeProvider(prices={"AAPL": 100.0, "MSFT": 50.0})
+    quotes = run(fetch_quotes(ProviderRouter([primary, backup]), ["AAPL", "MSFT"]))
+    assert set(quotes) == {"AAPL", "MSFT"}
+    assert primary.calls and backup.calls
+
+
+def test_invalid_symbols_are_left_out():
+    provider = FakeProvider(prices={"AAPL": 100.0})
+    quotes = run(fetch_quotes(ProviderRouter([provider]), ["AAPL", "NOPE"]))
+    assert set(quotes) == {"AAPL"}
+
+
+def test_circuit_opens_after_repeated_failures():
+    primary = FakeProvider(failing=True)
+    primary.name = "primary"
+    backup = FakeProvider()
+    router = ProviderRouter([primary, backup])
+    for _ in range(3):
+        run(fetch_quotes(router, ["AAPL"], retries=1))
+    assert router.health["primary"].state == "open"
+    calls = len(primary.calls)
+    run(fetch_quotes(router, ["AAPL"], retries=1))
+    assert len(primary.calls) == calls
+
+
+def test_exhausted_provider_is_skipped():
+    primary = FakeProvider(monthly_limit=1)
+    primary.name = "primary"
+    backup = FakeProvider()
+    router = ProviderRouter([primary, backup])
+    run(fetch_quotes(router, ["AAPL"]))
+    run(fetch_quotes(router, ["MSFT"]))
+    assert primary.calls == [["AAPL"]]
+    assert backup.calls == [["MSFT"]]
+
+
+def test_exhausted_quota_resets_next_month():
+    provider = FakeProvider(monthly_limit=1)
+    provider.request_count = 1
+    provider.reset_date = datetime(2020, 1, 1)
+    quotes = run(fetch_quotes(ProviderRouter([provider]), ["AAPL"]))
+    assert set(quotes) == {"AAPL"}
+    assert provider.request_count == 1
+    assert provider.reset_date == next_month_start(datetime.now())
+
+
+def test_next_month_start_wraps_year():
+    assert next_month_start(datetime(2026, 12, 31, 23, 59)) == datetime(2027, 1, 1)
+    assert next_month_start(datetime(2026, 1, 31)) == datetime(2026, 2, 1)
+
+
+def test_multi_symbol_requests_prefer_batching_providers():
+    single = SingleSymbolProvider()
+    batching = FakeProvider()
+    router = ProviderRouter([single, batching])
+    quotes = run(fetch_quotes(router, [f"S{i}" for i in range(600)]))
+    assert len(quotes) == 600
+    assert single.calls == []
+    assert len(batching.calls) == 2
+    run(fetch_quotes(router, ["AAPL"]))
+    assert single.calls == [["AAPL"]]
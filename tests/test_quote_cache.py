@@ -0,0 +1,23 @@
+import os
+import time
+
+from providers import Quote
+from quote_cache import QuoteCache
+
+
+def test_day_changes_only_use_quotes_fetched_today():
+    cache = QuoteCache(":memory:")
+    cache.put_many({"AAPL": Quote("AAPL", 105.0, 100.0, time.time())})
+    cache.put_many({"OLD": Quote("OLD", 10.0, 5.0, 0)}, fetched_at=time.time() - 3 * 86400)
+    assert cache.day_changes() == {"AAPL": 5.0}
+
+
+def test_snapshot_round_trip_keeps_fetch_times(tmp_path):
+    path = os.path.join(tmp_path, "stocks.db")
+    cache = QuoteCache(path, ttl=300)
+    cache.put_many({"AAPL": Quote("AAPL", 105.0, 100.0, 1.0)}, fetched_at=time.time() - 200)
+    cache.snapshot()
+    restored = QuoteCache(path, ttl=300)
+    restored.load()
+    assert restored.get("AAPL").price == 105.0
+    assert restored.get("AAPL", max_age=100) is None
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import time
+
+from poll_planner import PollPlanner
+from sweep import SweepScheduler
+
+
+def test_slices_wrap_around_after_the_cursor(tmp_path):
+    sweep = SweepScheduler(os.path.join(tmp_path, "sweep.db"), window=30, slice_seconds=10)
+    symbols = ["A", "B", "C", "D", "E"]
+    assert sweep.next_slice(symbols) == ["A", "B"]
+    assert sweep.next_slice(symbols) == ["C", "D"]
+    assert sweep.next_slice(symbols) == ["E", "A"]
+    assert sweep.next_slice(symbols, min_size=4) == ["B", "C", "D", "E"]
+
+
+def test_cursor_survives_removed_symbols(tmp_path):
+    sweep = SweepScheduler(os.path.join(tmp_path, "sweep.db"), window=30, slice_seconds=10)
+    sweep.cursor = "C"
+    assert sweep.next_slice(["A", "B", "D"]) == ["D"]
+
+
+def test_cursor_and_poll_times_are_restored(tmp_path):
+    path = os.path.join(tmp_path, "sweep.db")
+    sweep = SweepScheduler(path)
+    sweep.next_slice(["A", "B", "C"], min_size=2)
+    sweep.save(["A"], polled_at=1e12)
+    restored = SweepScheduler(path)
+    assert restored.load() == {"A": 1e12}
+    assert restored.cursor == "B"
+
+
+def test_starts_window_survives_skipped_slices(tmp_path):
+    sweep = SweepScheduler(os.path.join(tmp_path, "sweep.db"), window=30, slice_seconds=10)
+    starts = []
+    for tick in [1, 2, 3, 5, 6, 7, 10]:
+        sweep.tick = tick
+        starts.append(sweep.starts_window())
+    assert starts == [True, False, False, True, False, True, True]
+
+
+def test_slow_slices_are_skipped_not_bunched(tmp_path):
+    sweep = SweepScheduler(os.path.join(tmp_path, "sweep.db"), window=1, slice_seconds=0.05)
+
+    async def sweep_slowly():
+        await sweep.wait_for_slice()
+        await asyncio.sleep(0.12)
+        await sweep.wait_for_slice()
+        return sweep.tick
+
+    assert asyncio.run(sweep_slowly()) >= 4
+
+
+def test_symbols_are_polled_once_per_window_despite_fetch_latency(tmp_path):
+    window, slice_seconds = 0.1, 0.02
+    sweep = SweepScheduler(os.path.join(tmp_path, "sweep.db"), window=window, slice_seconds=slice_seconds)
+    planner = PollPlanner(min_interval=window, tolerance=slice_seconds / 2)
+    symbols = [f"S{i}" for i in range(10)]
+    planner.plan({symbol: (1, 5) for symbol in symbols}, None, 86400)
+    polls = {symbol: [] for symbol in symbols}
+
+    # The monitor loop: check the due symbols of each slice, with some fetch latency
+    async def run_monitor():
+        end = time.monotonic() + 1.0
+        while time.monotonic() < end:
+            await sweep.wait_for_slice()
+            due = [symbol for symbol in sweep.next_slice(symbols) if planner.is_due(symbol, now=sweep.slice_start)]
+            await asyncio.sleep(0.005)
+            planner.mark_polled(due, now=sweep.slice_start)
+            for symbol in due:
+                polls[symbol].append(sweep.slice_start)
+
+    asyncio.run(run_monitor())
+    periods = sorted(b - a for times in polls.values() for a, b in zip(times, times[1:]))
+    assert periods
+    assert periods[len(periods) // 2] < 1.5 * window
@@ -0,0 +1,101 @@
+import numpy as np
+
+from watch_arrays import WatchArrays
+from watch_index import WatchIndex
+
+
+def build(rows, thresholds=None):
+    index = WatchIndex()
+    for guild_id, user_id, symbol, price in rows:
+        index.set_stock(guild_id, user_id, symbol, price)
+    for (guild_id, user_id), threshold in (thresholds or {}).items():
+        index.set_threshold(guild_id, user_id, threshold)
+    arrays = WatchArrays()
+    arrays.sync(index)
+    return index, arrays
+
+
+def test_evaluate_alerts_rows_past_their_threshold():
+    _, arrays = build([(1, 10, "AAPL", 100.0), (1, 11, "AAPL", 100.0), (1, 10, "MSFT", 50.0)],
+                      thresholds={(1, 11): 10})
+    current = arrays.symbol_array({"AAPL": 106.0, "MSFT": 51.0})
+    alerts, percent_change = arrays.evaluate(current)
+    alerted = {arrays.keys[row] for row in alerts}
+    assert alerted == {(1, 10, "AAPL")}
+    assert np.isclose(percent_change[arrays.keys.index((1, 10, "MSFT"))], 2.0)
+
+
+def test_evaluate_resets_reference_price_and_skips_unknown_prices():
+    _, arrays = build([(1, 10, "AAPL", 100.0), (1, 10, "NEW", None)])
+    arrays.evaluate(arrays.symbol_array({"AAPL": 106.0, "NEW": 20.0}))
+    alerts, _ = arrays.evaluate(arrays.symbol_array({"AAPL": 107.0, "NEW": 20.5}))
+    assert len(alerts) == 0
+    assert arrays.last_price.tolist() == [107.0, 20.5]
+
+
+def test_sync_keeps_live_prices_for_surviving_rows():
+    index, arrays = build([(1, 10, "AAPL", 100.0)])
+    arrays.evaluate(arrays.symbol_array({"AAPL": 120.0}), arrays.symbol_array({"AAPL": 100.0}))
+    index.set_stock(1, 10, "MSFT", 50.0)
+    assert arrays.sync(index)
+    row = arrays.keys.index((1, 10, "AAPL"))
+    assert arrays.last_price[row] == 120.0
+    assert np.isclose(arrays.day_change[row], 20.0)
+
+
+def test_watchlist_total_only_counts_remaining_symbols():
+    _, arrays = build([(1, 10, "AAPL", 100.0), (1, 10, "MSFT", 50.0)])
+    arrays.evaluate(arrays.symbol_array({"AAPL": 105.0, "MSFT": 51.0}),
+                    arrays.symbol_array({"AAPL": 100.0, "MSFT": 50.0}))
+    total, count = arrays.watchlist_total(1, 10, {"MSFT": 50.0})
+    assert count == 1 and np.isclose(total, 2.0)
+    assert arrays.watchlist_total(1, 10, {}) == (0, 0)
+
+
+def test_seeded_day_changes_survive_the_first_evaluate():
+    _, arrays = build([(1, 10, "AAPL", 100.0), (1, 10, "MSFT", 50.0)])
+    assert arrays.seed_day_changes({"AAPL": 3.0, "MSFT": -1.0}) == 2
+    arrays.evaluate(arrays.symbol_array({"AAPL": 105.0}), arrays.symbol_array({"AAPL": 100.0}))
+    assert arrays.group_totals([arrays.symbol_ids["AAPL"]]) == [((1, 10), 4.0, 2)]
+
+
+def test_incremental_sync_matches_a_full_rebuild():
+    index, arrays = build([(1, 10, "AAPL", 100.0), (1, 10, "MSFT", 50.0), (1, 11, "AAPL", 100.0)])
+    index.remove_stock(1, 10, "AAPL")
+    index.set_stock(1, 12, "TSLA", 200.0)
+    index.set_threshold(1, 11, 2)
+    index.remove_stock(1, 12, "TSLA")
+    index.set_stock(1, 12, "TSLA", 210.0)
+    assert arrays.sync(index)
+    full = WatchArrays()
+    full.sync(index)
+
+    def live_rows(watch_arrays):
+        return sorted((key, float(watch_arrays.threshold[row]), float(watch_arrays.last_price[row]))
+                      for key, row in watch_arrays.rows.items())
+
+    assert live_rows(arrays) == live_rows(full)
+
+
+def test_removed_rows_are_ignored_until_compacted():
+    index, arrays = build([(1, 10, "AAPL", 100.0), (1, 11, "AAPL", 100.0)])
+    index.remove_stock(1, 10, "AAPL")
+    arrays.sync(index)
+    alerts, _ = arrays.evaluate(arrays.symbol_array({"AAPL": 150.0}))
+    assert [arrays.keys[row] for row in alerts] == [(1, 11, "AAPL")]
+    watchers, _ = arrays.symbol_stats()
+    assert watchers[arrays.symbol_ids["AAPL"]] == 1
+    arrays.compact()
+    assert arrays.keys == [(1, 11, "AAPL")]
+    assert arrays.last_price.tolist() == [150.0]
+
+
+def test_overflowed_change_log_falls_back_to_a_rebuild():
+    index = WatchIndex(max_changes=2)
+    arrays = WatchArrays()
+    arrays.sync(index)
+    for symbol in ["A", "B", "C", "D"]:
+        index.set_stock(1, 10, symbol, 1.0)
+    assert index.changes_since(arrays.version) is None
+    arrays.sync(index)
+    assert sorted(arrays.rows) == [(1, 10, symbol) for symbol in "ABCD"]
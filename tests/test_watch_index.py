@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from watch_index import DEFAULT_THRESHOLD, WatchIndex
+
+
+def stock_change(op, old=None, new=None):
+    return json.dumps({"table": "stocks", "op": op, "old": old, "new": new})
+
+
+def threshold_change(op, old=None, new=None):
+    return json.dumps({"table": "thresholds", "op": op, "old": old, "new": new})
+
+
+def row(guild_id, user_id, symbol, last_price=None):
+    return {"guild_id": guild_id, "user_id": user_id, "symbol": symbol, "last_price": last_price}
+
+
+def test_insert_and_delete_stock():
+    index = WatchIndex()
+    index.apply(stock_change("INSERT", new=row(1, 10, "AAPL", 100.0)))
+    assert index.stocks(1, 10) == {"AAPL": 100.0}
+    assert index.by_symbol["AAPL"] == {(1, 10): 100.0}
+    index.apply(stock_change("DELETE", old=row(1, 10, "AAPL", 100.0)))
+    assert index.stocks(1, 10) == {}
+    assert index.by_symbol == {} and index.by_user == {}
+
+
+def test_update_that_changes_the_key_moves_the_row():
+    index = WatchIndex()
+    index.apply(stock_change("INSERT", new=row(1, 10, "AAPL", 100.0)))
+    index.apply(stock_change("UPDATE", old=row(1, 10, "AAPL", 100.0), new=row(1, 10, "MSFT", 50.0)))
+    assert index.stocks(1, 10) == {"MSFT": 50.0}
+    assert "AAPL" not in index.by_symbol
+
+
+def test_update_of_the_price_keeps_the_row():
+    index = WatchIndex()
+    index.apply(stock_change("INSERT", new=row(1, 10, "AAPL", 100.0)))
+    index.apply(stock_change("UPDATE", old=row(1, 10, "AAPL", 100.0), new=row(1, 10, "AAPL", 101.0)))
+    assert index.stocks(1, 10) == {"AAPL": 101.0}
+    assert [change[1] for change in index.changes] == ["stock", "stock"]
+
+
+def test_threshold_set_update_and_delete():
+    index = WatchIndex()
+    threshold = {"guild_id": 1, "user_id": 10, "threshold": 2.5}
+    index.apply(threshold_change("INSERT", new=threshold))
+    assert index.get_threshold(1, 10) == 2.5
+    index.apply(threshold_change("UPDATE", old=threshold, new=dict(threshold, threshold=7)))
+    assert index.get_threshold(1, 10) == 7
+    index.apply(threshold_change("DELETE", old=threshold))
+    assert index.get_threshold(1, 10) == DEFAULT_THRESHOLD
+
+
+def test_every_change_bumps_the_version_and_is_logged():
+    index = WatchIndex()
+    index.apply(stock_change("INSERT", new=row(1, 10, "AAPL")))
+    index.apply(threshold_change("INSERT", new={"guild_id": 1, "user_id": 10, "threshold": 3}))
+    assert index.version == 2
+    assert index.changes_since(0) == [(1, "stock", (1, 10, "AAPL"), None), (2, "threshold", (1, 10), None)]
+    assert index.changes_since(2) == []
+
+
+@pytest.mark.parametrize("payload", ["not json", json.dumps({"op": "INSERT"}),
+                                     stock_change("INSERT", new={"guild_id": 1})])
+def test_malformed_payloads_raise_the_errors_the_listener_skips(payload):
+    index = WatchIndex()
+    with pytest.raises((ValueError, KeyError)):
+        index.apply(payload)
+    assert index.by_user == {}
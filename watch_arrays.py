@@ -0,0 +1,248 @@
+from datetime import datetime
+
+import numpy as np
+
+
+# Columnar copy of the watch index for the monitor. One entry per watch row:
+#   sym        interned symbol id (int32)
+#   guild/user owning guild and user ids (int64)
+#   group      id of the (guild, user) watchlist the row belongs to (int32)
+#   last_price last price the row was checked at (float64, NaN if unknown)
+#   threshold  alert threshold in percent (float64)
+#   day_change today's percent change of the symbol (float64, NaN until quoted)
+#   alive      False for removed rows that have not been compacted away yet
+# Threshold checks run as array operations, so only rows that cross a threshold become Python objects.
+# Watchlist changes are applied incrementally from the index's change log: new rows are appended,
+# removed rows are blanked out and compacted once they make up a quarter of the arrays.
+class WatchArrays:
+    def __init__(self):
+        self.symbol_ids = {}
+        self.symbols = []
+        self.version = None
+        self.day = None
+        self.keys = []       # (guild_id, user_id, symbol) per row, None for removed rows
+        self.rows = {}       # (guild_id, user_id, symbol) -> row
+        self.group_keys = []
+        self.group_ids = {}  # (guild_id, user_id) -> group id
+        self.removed = 0
+        self.sym = np.empty(0, dtype=np.int32)
+        self.guild = np.empty(0, dtype=np.int64)
+        self.user = np.empty(0, dtype=np.int64)
+        self.group = np.empty(0, dtype=np.int32)
+        self.last_price = np.empty(0, dtype=np.float64)
+        self.threshold = np.empty(0, dtype=np.float64)
+        self.day_change = np.empty(0, dtype=np.float64)
+        self.alive = np.empty(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.sym)
+
+    def intern(self, symbol):
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbol_ids[symbol] = symbol_id
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def group_id(self, guild_id, user_id):
+        group_id = self.group_ids.get((guild_id, user_id))
+        if group_id is None:
+            group_id = len(self.group_keys)
+            self.group_ids[(guild_id, user_id)] = group_id
+            self.group_keys.append((guild_id, user_id))
+        return group_id
+
+    # Bring the arrays up to date with the watch index. Returns True if anything changed.
+    def sync(self, watch_index):
+        if self.version == watch_index.version:
+            return False
+        changes = watch_index.changes_since(self.version)
+        if changes is None:
+            self.rebuild(watch_index)
+        else:
+            self.apply_changes(changes, watch_index)
+        self.version = watch_index.version
+        return True
+
+    # Rebuild every row from the index. Prices and daily changes already known for existing rows
+    # are carried over, since the monitor updates them here rather than in the index.
+    def rebuild(self, watch_index):
+        previous = self.rows
+        old_last_price, old_day_change = self.last_price, self.day_change
+
+        keys = []
+        sym, last_price, threshold = [], [], []
+        for (guild_id, user_id), stocks in list(watch_index.by_user.items()):
+            user_threshold = watch_index.get_threshold(guild_id, user_id)
+            for symbol, price in list(stocks.items()):
+                keys.append((guild_id, user_id, symbol))
+                sym.append(self.intern(symbol))
+                last_price.append(np.nan if price is None else price)
+                threshold.append(user_threshold)
+
+        self.group_keys = []
+        self.group_ids = {}
+        self.sym = np.array(sym, dtype=np.int32)
+        self.group = np.array([self.group_id(key[0], key[1]) for key in keys], dtype=np.int32)
+        self.guild = np.array([key[0] for key in keys], dtype=np.int64)
+        self.user = np.array([key[1] for key in keys], dtype=np.int64)
+        self.last_price = np.array(last_price, dtype=np.float64)
+        self.threshold = np.array(threshold, dtype=np.float64)
+        self.day_change = np.full(len(keys), np.nan)
+        self.alive = np.ones(len(keys), dtype=bool)
+
+        # Carry over live values for rows that survived the rebuild
+        if previous:
+            old_rows = np.array([previous.get(key, -1) for key in keys], dtype=np.int64)
+            kept = old_rows >= 0
+            self.last_price[kept] = np.where(np.isnan(old_last_price[old_rows[kept]]),
+                                             self.last_price[kept], old_last_price[old_rows[kept]])
+            self.day_change[kept] = old_day_change[old_rows[kept]]
+
+        self.keys = keys
+        self.rows = {key: row for row, key in enumerate(keys)}
+        self.removed = 0
+
+    # Apply change log entries from the index (see WatchIndex.changes)
+    def apply_changes(self, changes, watch_index):
+        added = {}
+        for _, op, key, last_price in changes:
+            if op == "stock":
+                row = self.rows.get(key)
+                if row is None:
+                    added[key] = last_price
+                elif np.isnan(self.last_price[row]) and last_price is not None:
+                    self.last_price[row] = last_price
+            elif op == "unstock":
+                if added.pop(key, None) is None and key in self.rows:
+                    self.remove_row(self.rows.pop(key))
+            elif op == "threshold":
+                group_id = self.group_ids.get(key)
+                if group_id is not None:
+                    rows = (self.group == group_id) & self.alive
+                    self.threshold[rows] = watch_index.get_threshold(*key)
+
+        if added:
+            self.append_rows(added, watch_index)
+        if self.removed > max(len(self.sym) // 4, 64):
+            self.compact()
+
+    def append_rows(self, added, watch_index):
+        keys = list(added)
+        count = len(keys)
+        self.sym = np.concatenate([self.sym, np.array([self.intern(key[2]) for key in keys], dtype=np.int32)])
+        self.group = np.concatenate([self.group, np.array([self.group_id(key[0], key[1]) for key in keys], dtype=np.int32)])
+        self.guild = np.concatenate([self.guild, np.array([key[0] for key in keys], dtype=np.int64)])
+        self.user = np.concatenate([self.user, np.array([key[1] for key in keys], dtype=np.int64)])
+        self.last_price = np.concatenate([self.last_price, np.array(
+            [np.nan if added[key] is None else added[key] for key in keys], dtype=np.float64)])
+        self.threshold = np.concatenate([self.threshold, np.array(
+            [watch_index.get_threshold(key[0], key[1]) for key in keys], dtype=np.float64)])
+        self.day_change = np.concatenate([self.day_change, np.full(count, np.nan)])
+        self.alive = np.concatenate([self.alive, np.ones(count, dtype=bool)])
+        for key in keys:
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+
+    # Blank out a removed row so no check, score or statistic sees it until the next compaction
+    def remove_row(self, row):
+        self.alive[row] = False
+        self.last_price[row] = np.nan
+        self.day_change[row] = np.nan
+        self.threshold[row] = np.inf
+        self.keys[row] = None
+        self.removed += 1
+
+    def compact(self):
+        keep = self.alive
+        for name in ("sym", "group", "guild", "user", "last_price", "threshold", "day_change"):
+            setattr(self, name, getattr(self, name)[keep])
+        self.alive = np.ones(len(self.sym), dtype=bool)
+        self.keys = [key for key in self.keys if key is not None]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.removed = 0
+
+    # Per-symbol array of values, NaN for symbols without a value
+    def symbol_array(self, values):
+        array = np.full(len(self.symbols), np.nan)
+        for symbol, value in values.items():
+            symbol_id = self.symbol_ids.get(symbol)
+            if symbol_id is not None and value is not None:
+                array[symbol_id] = value
+        return array
+
+    # Forget yesterday's daily changes
+    def roll_day(self):
+        today = datetime.now().date()
+        if today != self.day:
+            self.day = today
+            self.day_change[:] = np.nan
+
+    # Fill unknown daily changes from per-symbol values, e.g. today's quotes cached before a restart.
+    # Returns the number of rows filled.
+    def seed_day_changes(self, changes):
+        self.roll_day()
+        if not changes or not len(self.sym):
+            return 0
+        values = self.symbol_array(changes)[self.sym]
+        missing = np.isnan(self.day_change) & ~np.isnan(values) & self.alive
+        self.day_change[missing] = values[missing]
+        return int(missing.sum())
+
+    # Check every row against the per-symbol current prices in one pass.
+    # Returns the indexes of rows that crossed their threshold and the percent change of every row,
+    # then records the new prices as each row's last price.
+    def evaluate(self, current, prev_close=None):
+        self.roll_day()
+
+        row_price = current[self.sym]
+        quoted = (row_price > 0) & self.alive  # False for NaN and removed rows
+        comparable = quoted & (self.last_price > 0)
+
+        percent_change = np.zeros(len(self.sym))
+        np.divide(row_price - self.last_price, self.last_price, out=percent_change, where=comparable)
+        percent_change *= 100
+        alerts = np.flatnonzero(comparable & (np.abs(percent_change) >= self.threshold))
+
+        if prev_close is not None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                symbol_change = (current - prev_close) / prev_close * 100
+            row_change = symbol_change[self.sym]
+            changed = quoted & np.isfinite(row_change)
+            self.day_change[changed] = row_change[changed]
+
+        self.last_price[quoted] = row_price[quoted]
+        return alerts, percent_change
+
+    # Per-watchlist (sum of daily changes, count) for the watchlists touched by the quoted symbols
+    def group_totals(self, quoted_symbols):
+        touched = np.isin(self.sym, quoted_symbols)
+        scored = ~np.isnan(self.day_change)
+        groups = len(self.group_keys)
+        totals = np.bincount(self.group[scored], weights=self.day_change[scored], minlength=groups)
+        counts = np.bincount(self.group[scored], minlength=groups)
+        touched_groups = np.unique(self.group[touched & scored])
+        return [(self.group_keys[g], float(totals[g]), int(counts[g])) for g in touched_groups]
+
+    # (sum of daily changes, count) for one watchlist over the symbols it still watches.
+    # Reads the current rows without rebuilding them, so it is safe while the monitor holds row indexes.
+    def watchlist_total(self, guild_id, user_id, symbols):
+        rows = np.flatnonzero((self.guild == guild_id) & (self.user == user_id) & ~np.isnan(self.day_change))
+        changes = [float(self.day_change[row]) for row in rows if self.symbols[self.sym[row]] in symbols]
+        return sum(changes), len(changes)
+
+    # Per-symbol watcher count and lowest watcher threshold
+    def symbol_stats(self):
+        watchers = np.bincount(self.sym[self.alive], minlength=len(self.symbols))
+        min_threshold = np.full(len(self.symbols), np.inf)
+        np.minimum.at(min_threshold, self.sym[self.alive], self.threshold[self.alive])
+        return watchers, min_threshold
+
+    # Per-symbol closest approach to a threshold: the largest |percent change| / threshold over its watchers
+    def symbol_proximity(self, percent_change):
+        proximity = np.zeros(len(self.symbols))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.nan_to_num(np.abs(percent_change) / self.threshold, posinf=0.0)
+        np.maximum.at(proximity, self.sym, ratio)
+        return proximity
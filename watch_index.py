@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+from collections import deque
+
+import psycopg2
+
+WATCH_CHANNEL = "watch_changed"
+DEFAULT_THRESHOLD = 5
+
+# Triggers that publish every change to stocks and thresholds on WATCH_CHANNEL, whichever
+# process made it, so each bot instance can keep its in-memory index current.
+WATCH_TRIGGERS_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_watch_change() RETURNS trigger AS $$
+BEGIN
+    -- The monitor's own bulk price refreshes set this to avoid one notification per row
+    IF current_setting('stockbot.skip_watch_notify', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('{WATCH_CHANNEL}', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'old', CASE WHEN TG_OP <> 'INSERT' THEN row_to_json(OLD) END,
+        'new', CASE WHEN TG_OP <> 'DELETE' THEN row_to_json(NEW) END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS stocks_watch_notify ON stocks;
+CREATE TRIGGER stocks_watch_notify AFTER INSERT OR UPDATE OR DELETE ON stocks
+    FOR EACH ROW EXECUTE FUNCTION notify_watch_change();
+
+DROP TRIGGER IF EXISTS thresholds_watch_notify ON thresholds;
+CREATE TRIGGER thresholds_watch_notify AFTER INSERT OR UPDATE OR DELETE ON thresholds
+    FOR EACH ROW EXECUTE FUNCTION notify_watch_change();
+"""
+
+
+# Resident index of who watches what:
+#   by_symbol:  symbol -> {(guild_id, user_id): last_price}
+#   by_user:    (guild_id, user_id) -> {symbol: last_price}
+#   thresholds: (guild_id, user_id) -> alert threshold
+# Built once from the database, then kept current from LISTEN/NOTIFY and local writes.
+# last_price is the price stored when the row was written; the monitor tracks live prices itself.
+# `version` increases on every change so derived structures know when to update. The most recent
+# changes are kept as (version, op, key, last_price) so they can be applied incrementally:
+#   ("stock", (guild_id, user_id, symbol), last_price)   row added or re-written
+#   ("unstock", (guild_id, user_id, symbol), None)       row removed
+#   ("threshold", (guild_id, user_id), None)             threshold set or removed
+class WatchIndex:
+    def __init__(self, max_changes=10000):
+        self.by_symbol = {}
+        self.by_user = {}
+        self.thresholds = {}
+        self.version = 0
+        self.build_version = 0
+        self.changes = deque(maxlen=max_changes)
+        self.ready_event = asyncio.Event()
+
+    @property
+    def ready(self):
+        return self.ready_event.is_set()
+
+    async def wait_ready(self):
+        await self.ready_event.wait()
+
+    def build(self, conn):
+        by_symbol = {}
+        by_user = {}
+        thresholds = {}
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT guild_id, user_id, symbol, last_price FROM stocks")
+            for guild_id, user_id, symbol, last_price in cursor.fetchall():
+                by_symbol.setdefault(symbol, {})[(guild_id, user_id)] = last_price
+                by_user.setdefault((guild_id, user_id), {})[symbol] = last_price
+            cursor.execute("SELECT guild_id, user_id, threshold FROM thresholds")
+            for guild_id, user_id, threshold in cursor.fetchall():
+                thresholds[(guild_id, user_id)] = threshold
+        # Swap in whole structures so readers on the event loop never see a half-built index
+        self.by_symbol, self.by_user, self.thresholds = by_symbol, by_user, thresholds
+        self.version += 1
+        self.build_version = self.version
+        self.changes.clear()
+        logging.info(f"Watch index built: {len(by_symbol)} symbols, {len(by_user)} watchlists.")
+
+    def set_stock(self, guild_id, user_id, symbol, last_price):
+        self.by_symbol.setdefault(symbol, {})[(guild_id, user_id)] = last_price
+        self.by_user.setdefault((guild_id, user_id), {})[symbol] = last_price
+        self.record("stock", (guild_id, user_id, symbol), last_price)
+
+    def remove_stock(self, guild_id, user_id, symbol):
+        watchers = self.by_symbol.get(symbol, {})
+        watchers.pop((guild_id, user_id), None)
+        if not watchers:
+            self.by_symbol.pop(symbol, None)
+        symbols = self.by_user.get((guild_id, user_id), {})
+        symbols.pop(symbol, None)
+        if not symbols:
+            self.by_user.pop((guild_id, user_id), None)
+        self.record("unstock", (guild_id, user_id, symbol))
+
+    def set_threshold(self, guild_id, user_id, threshold):
+        self.thresholds[(guild_id, user_id)] = threshold
+        self.record("threshold", (guild_id, user_id))
+
+    def remove_threshold(self, guild_id, user_id):
+        self.thresholds.pop((guild_id, user_id), None)
+        self.record("threshold", (guild_id, user_id))
+
+    def record(self, op, key, last_price=None):
+        self.version += 1
+        self.changes.append((self.version, op, key, last_price))
+
+    # Changes made after `version`, oldest first, or None when they are no longer all known
+    # (never synced, the index was rebuilt since, or the change log overflowed)
+    def changes_since(self, version):
+        if version is None or version < self.build_version:
+            return None
+        if version == self.version:
+            return []
+        if not self.changes or self.changes[0][0] > version + 1:
+            return None
+        return [change for change in self.changes if change[0] > version]
+
+    def get_threshold(self, guild_id, user_id):
+        return self.thresholds.get((guild_id, user_id), DEFAULT_THRESHOLD)
+
+    def stocks(self, guild_id, user_id):
+        return dict(self.by_user.get((guild_id, user_id), {}))
+
+    # Apply one NOTIFY payload from the triggers
+    def apply(self, payload):
+        change = json.loads(payload)
+        old, new = change.get("old"), change.get("new")
+        if change["table"] == "stocks":
+            if old and (not new or (old["guild_id"], old["user_id"], old["symbol"]) != (new["guild_id"], new["user_id"], new["symbol"])):
+                self.remove_stock(old["guild_id"], old["user_id"], old["symbol"])
+            if new:
+                self.set_stock(new["guild_id"], new["user_id"], new["symbol"], new["last_price"])
+        elif change["table"] == "thresholds":
+            if old and not new:
+                self.remove_threshold(old["guild_id"], old["user_id"])
+            if new:
+                self.set_threshold(new["guild_id"], new["user_id"], new["threshold"])
+
+    # Keep the index current for as long as the bot runs. Each (re)connection issues LISTEN
+    # before rebuilding, so no change can fall between the snapshot and the first notification.
+    async def listen(self, connect, reconnect_delay=5):
+        loop = asyncio.get_running_loop()
+        while True:
+            conn = None
+            fd = None
+            disconnected = asyncio.Event()
+            try:
+                conn = await asyncio.to_thread(connect)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {WATCH_CHANNEL}")
+                await asyncio.to_thread(self.build, conn)
+                self.ready_event.set()
+                fd = conn.fileno()
+
+                def on_notify():
+                    try:
+                        conn.poll()
+                    except psycopg2.Error:
+                        logging.exception("Watch index listener connection lost.")
+                        loop.remove_reader(fd)
+                        disconnected.set()
+                        return
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            self.apply(notify.payload)
+                        except (ValueError, KeyError):
+                            logging.exception(f"Ignoring malformed watch notification: {notify.payload}")
+
+                loop.add_reader(fd, on_notify)
+                on_notify()  # Drain anything that arrived while the index was being built
+                await disconnected.wait()
+            except asyncio.CancelledError:
+                if fd is not None:
+                    loop.remove_reader(fd)
+                raise
+            except Exception:
+                logging.exception("Watch index listener failed.")
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+            await asyncio.sleep(reconnect_delay)